@@ -1,37 +1,345 @@
 import os
+import zlib
+import shutil
+import struct
 import asyncio
+import tempfile
+from fractions import Fraction
 from PIL import Image
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from .LockManager import lock_manager
+from .Log import log
+
+# Заголовок не разобран: DPI читаем через PIL
+UNKNOWN = object()
+
+# Сколько байт начала файла читает быстрый разбор заголовка
+HEADER_SIZE = 65536
+
+def tiff_dpi(data:bytes, base:int=0, exif:bool=False):
+    # Теги XResolution (282), YResolution (283) и ResolutionUnit (296) из IFD0
+    order = {b"II": "<", b"MM": ">"}.get(data[base:base + 2])
+    if order is None or struct.unpack_from(order + "H", data, base + 2)[0] != 42:
+        return UNKNOWN
+    ifd = base + struct.unpack_from(order + "I", data, base + 4)[0]
+    count = struct.unpack_from(order + "H", data, ifd)[0]
+    tags = {}
+    for i in range(count):
+        tag, kind, _, value = struct.unpack_from(order + "HHI4s", data, ifd + 2 + i * 12)
+        if tag not in (282, 283, 296):
+            continue
+        if kind == 3:
+            tags[tag] = struct.unpack_from(order + "H", value)[0]
+        elif kind == 4:
+            tags[tag] = struct.unpack_from(order + "I", value)[0]
+        elif kind == 5:
+            num, den = struct.unpack_from(order + "II", data, base + struct.unpack_from(order + "I", value)[0])
+            tags[tag] = num / den if den else float("nan")
+        else:
+            return UNKNOWN
+
+    if exif:
+        # Как в PIL: без тегов или с некорректным значением JPEG получает 72 dpi
+        if 282 not in tags or 296 not in tags or tags[282] != tags[282]:
+            return 72, 72
+        dpi = tags[282] * 2.54 if tags[296] == 3 else tags[282]
+        return dpi, dpi
+
+    xres, yres = tags.get(282, 1), tags.get(283, 1)
+    if not (xres and yres):
+        return None
+    unit = tags.get(296)
+    if unit == 3:
+        return xres * 2.54, yres * 2.54
+    return (xres, yres) if unit in (2, None) else None
+
+def jpeg_dpi(data:bytes):
+    i = 2
+    exif = None
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return UNKNOWN
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            break
+        length = struct.unpack_from(">H", data, i + 2)[0]
+        if i + 2 + length > len(data):
+            return UNKNOWN
+        segment = data[i + 4:i + 2 + length]
+        if marker == 0xE0 and segment.startswith(b"JFIF") and len(segment) >= 12:
+            unit = segment[7]
+            density = struct.unpack_from(">HH", segment, 8)
+            if unit == 1:
+                return density
+            if unit == 2:
+                return tuple(d * 2.54 for d in density)
+        elif marker == 0xE1 and segment.startswith(b"Exif\x00\x00") and exif is None:
+            exif = segment[6:]
+        i += 2 + length
+    else:
+        return UNKNOWN
+
+    return None if exif is None else tiff_dpi(exif, exif=True)
+
+def png_dpi(data:bytes):
+    i = 8
+    while i + 8 <= len(data):
+        length, kind = struct.unpack_from(">I4s", data, i)
+        if kind == b"pHYs":
+            if i + 17 > len(data):
+                return UNKNOWN
+            px, py, unit = struct.unpack_from(">IIB", data, i + 8)
+            return (px * 0.0254, py * 0.0254) if unit == 1 else None
+        if kind in (b"IDAT", b"IEND"):
+            return None
+        i += 12 + length
+    return UNKNOWN
+
+# Быстрый путь: разбор только заголовка JPEG (JFIF/EXIF), PNG (pHYs) и TIFF
+def header_dpi(image_path:str):
+    with open(image_path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    try:
+        if data[:2] == b"\xff\xd8":
+            return jpeg_dpi(data)
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return png_dpi(data)
+        if data[:4] in (b"II*\x00", b"MM\x00*"):
+            return tiff_dpi(data)
+    except (struct.error, ZeroDivisionError):
+        pass
+    return UNKNOWN
+
+# Работа с PIL вынесена в функции модуля, чтобы их можно было отдавать и в пул процессов
+def read_dpi(image_path:str) -> tuple|None:
+    if os.path.isfile(image_path):
+        dpi = header_dpi(image_path)
+        if dpi is not UNKNOWN:
+            return dpi
+        with Image.open(image_path) as img:
+            return img.info.get('dpi')
+
+# Правки заголовка без перекодирования: список (смещение, длина заменяемого куска, новые байты)
+def jpeg_edits(data:bytes, dpi:tuple) -> list|None:
+    density = struct.pack(">BHH", 1, *(round(d) for d in dpi))
+    i = 2
+    while i + 4 <= len(data) and data[i] == 0xFF:
+        marker = data[i + 1]
+        if marker in (0xD9, 0xDA):
+            break
+        length = struct.unpack_from(">H", data, i + 2)[0]
+        if marker == 0xE0 and data[i + 4:i + 8] == b"JFIF" and length >= 14:
+            # Поле единиц и плотности по X/Y внутри сегмента APP0
+            return [(i + 11, 5, density)]
+        i += 2 + length
+    # JFIF нет: вставляем сегмент APP0 сразу после SOI
+    return [(2, 0, b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00\x01\x01" + density + b"\x00\x00")]
+
+def png_edits(data:bytes, dpi:tuple) -> list|None:
+    body = struct.pack(">IIB", *(int(d / 0.0254 + 0.5) for d in dpi), 1)
+    chunk = struct.pack(">I", len(body)) + b"pHYs" + body + struct.pack(">I", zlib.crc32(b"pHYs" + body))
+    i = 8
+    while i + 8 <= len(data):
+        length, kind = struct.unpack_from(">I4s", data, i)
+        if kind == b"pHYs":
+            return [(i, 12 + length, chunk)]
+        if kind in (b"IDAT", b"IEND"):
+            # pHYs обязан стоять до первого IDAT
+            return [(i, 0, chunk)]
+        i += 12 + length
+    return None
+
+def tiff_edits(data:bytes, dpi:tuple) -> list|None:
+    # Меняем только уже существующие теги разрешения: добавление тегов требует перестройки IFD
+    order = {b"II": "<", b"MM": ">"}.get(data[:2])
+    if order is None:
+        return None
+    ifd = struct.unpack_from(order + "I", data, 4)[0]
+    count = struct.unpack_from(order + "H", data, ifd)[0]
+    edits = {}
+    for i in range(count):
+        entry = ifd + 2 + i * 12
+        tag, kind, _, value = struct.unpack_from(order + "HHI4s", data, entry)
+        if tag in (282, 283):
+            if kind != 5:
+                return None
+            ratio = Fraction(dpi[tag - 282]).limit_denominator(10000)
+            offset = struct.unpack_from(order + "I", value)[0]
+            edits[tag] = (offset, 8, struct.pack(order + "II", ratio.numerator, ratio.denominator))
+        elif tag == 296:
+            if kind != 3:
+                return None
+            edits[tag] = (entry + 8, 2, struct.pack(order + "H", 2))
+    if 282 not in edits or 283 not in edits:
+        return None
+    edits = sorted(edits.values())
+    # X и Y могут ссылаться на одно рациональное значение: такие правки пересекаются, пусть перекодирует PIL
+    for (offset, size, _), (next_offset, _, _) in zip(edits, edits[1:]):
+        if offset + size > next_offset:
+            return None
+    return edits
+
+def dpi_edits(image_path:str, dpi:tuple) -> list|None:
+    with open(image_path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    try:
+        if data[:2] == b"\xff\xd8":
+            return jpeg_edits(data, dpi)
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return png_edits(data, dpi)
+        if data[:4] in (b"II*\x00", b"MM\x00*"):
+            return tiff_edits(data, dpi)
+    except struct.error:
+        pass
+    return None
+
+# Копия файла с правками во временный файл рядом и атомарная замена оригинала
+def replace_with_edits(image_path:str, edits:list) -> None:
+    directory = os.path.dirname(os.path.abspath(image_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".dpi-")
+    try:
+        with open(image_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            position = 0
+            for offset, length, data in edits:
+                dst.write(src.read(offset - position))
+                dst.write(data)
+                src.seek(offset + length)
+                position = offset + length
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        shutil.copymode(image_path, temp_path)
+        os.replace(temp_path, image_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def write_dpi(image_path:str, dpi:tuple, lossless:bool=True) -> bool:
+    if not os.path.isfile(image_path):
+        return False
+    if read_dpi(image_path) == dpi:
+        return False
+    if lossless:
+        edits = dpi_edits(image_path, dpi)
+        if edits is not None:
+            replace_with_edits(image_path, edits)
+            return True
+    # Формат не поддерживает правку заголовка: перекодируем через PIL
+    with Image.open(image_path) as img:
+        img.save(image_path, dpi=dpi, quality=100)
+        return True
 
 class DPIAsync:
+    # Общий долгоживущий пул для всех операций с изображениями
+    executor = None
+    max_workers = None
+    processes = False
+    concurrency = 32
+    # Правка DPI в заголовке без перекодирования изображения
+    lossless = True
+    # LRU-кэш DPI: путь -> (mtime_ns, size, dpi)
+    cache = OrderedDict()
+    cache_size = 4096
+
     def __init__(self) -> None:
         pass
-    
+
+    @classmethod
+    def configure(cls, max_workers:int|None=None, processes:bool=False, concurrency:int=32, lossless:bool=True) -> None:
+        cls.shutdown()
+        cls.max_workers = max_workers
+        cls.processes = processes
+        cls.concurrency = max(1, concurrency)
+        cls.lossless = lossless
+
+    @classmethod
+    def get_executor(cls):
+        if cls.executor is None:
+            cls.executor = (ProcessPoolExecutor if cls.processes else ThreadPoolExecutor)(max_workers=cls.max_workers)
+        return cls.executor
+
+    @classmethod
+    def shutdown(cls, wait:bool=True) -> None:
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=wait)
+            cls.executor = None
+
+    @classmethod
+    async def run(cls, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(cls.get_executor(), fn, *args)
+
     @staticmethod
-    async def get(image_path:str) -> tuple|None:
+    def normalize(dpi:tuple|int) -> tuple:
+        return (dpi, dpi) if isinstance(dpi, int) else tuple(dpi)
+
+    @classmethod
+    async def read(cls, image_path:str) -> tuple|None:
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        cached = cls.cache.get(image_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            cls.cache.move_to_end(image_path)
+            return cached[2]
+
+        dpi = await cls.run(read_dpi, image_path)
+        cls.cache[image_path] = (stat.st_mtime_ns, stat.st_size, dpi)
+        cls.cache.move_to_end(image_path)
+        while len(cls.cache) > cls.cache_size:
+            cls.cache.popitem(last=False)
+        return dpi
+
+    @classmethod
+    async def write(cls, image_path:str, dpi:tuple) -> bool:
+        try:
+            return await cls.run(write_dpi, image_path, dpi, cls.lossless)
+        finally:
+            cls.cache.pop(image_path, None)
+
+    @classmethod
+    async def get(cls, image_path:str) -> tuple|None:
         async with lock_manager.get_lock_async(image_path):
-            if os.path.isfile(image_path):
-                try:
-                    with Image.open(image_path) as img:
-                        return img.info.get('dpi')
-                except Exception as e:
-                    print(f"Ошибка при загрузке DPI данных: {e}")
+            try:
+                return await cls.read(image_path)
+            except Exception as e:
+                log.error("Ошибка при загрузке DPI данных: %s", e, path=image_path)
 
-    @staticmethod
-    async def set(image_path:str, dpi:tuple|int=300) -> None:
+    @classmethod
+    async def set(cls, image_path:str, dpi:tuple|int=300) -> None:
         async with lock_manager.get_lock_async(image_path):
-            if os.path.isfile(image_path):
-                try:
-                    with Image.open(image_path) as img:
-                        old_dpi = img.info.get('dpi')
-                        if isinstance(dpi, int):
-                            dpi = (dpi, dpi)
-
-                        if not old_dpi == dpi:
-                            loop = asyncio.get_running_loop()
-                            with ThreadPoolExecutor() as pool:
-                                await loop.run_in_executor(pool, lambda: img.save(image_path, dpi=dpi, quality=100))
-                except Exception as e:
-                    print(f"Ошибка при обновлении DPI данных: {e}")
\ No newline at end of file
+            try:
+                await cls.write(image_path, cls.normalize(dpi))
+            except Exception as e:
+                log.error("Ошибка при обновлении DPI данных: %s", e, path=image_path)
+
+    # Пакетные операции: не больше concurrency файлов одновременно, результат или исключение по каждому пути
+    @classmethod
+    async def many(cls, fn, paths:list, *args, concurrency:int|None=None) -> dict:
+        semaphore = asyncio.Semaphore(concurrency or cls.concurrency)
+
+        async def one(image_path:str):
+            async with semaphore:
+                async with lock_manager.get_lock_async(image_path):
+                    try:
+                        return await fn(image_path, *args)
+                    except Exception as e:
+                        return e
+
+        results = await asyncio.gather(*(one(image_path) for image_path in paths))
+        return dict(zip(paths, results))
+
+    @classmethod
+    async def get_many(cls, paths:list, concurrency:int|None=None) -> dict:
+        return await cls.many(cls.read, paths, concurrency=concurrency)
+
+    # Значение True означает, что файл был перезаписан
+    @classmethod
+    async def set_many(cls, paths:list, dpi:tuple|int=300, concurrency:int|None=None) -> dict:
+        return await cls.many(cls.write, paths, cls.normalize(dpi), concurrency=concurrency)
\ No newline at end of file
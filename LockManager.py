@@ -0,0 +1,264 @@
+import asyncio
+import threading
+from collections import deque
+from time import perf_counter
+
+class LockStats:
+    # Счётчики ожидания и удержания блокировок одного вида
+    __slots__ = ("acquired", "contended", "wait_total", "wait_max", "hold_total", "hold_max")
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.acquired = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    def wait(self, seconds:float, contended:bool) -> None:
+        self.acquired += 1
+        if contended:
+            self.contended += 1
+        self.wait_total += seconds
+        if seconds > self.wait_max:
+            self.wait_max = seconds
+
+    def hold(self, seconds:float) -> None:
+        self.hold_total += seconds
+        if seconds > self.hold_max:
+            self.hold_max = seconds
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class SharedLock:
+    # Одна блокировка для with (любой поток) и async with (любой цикл событий).
+    # При release владение передаётся первому ожидающему: потоку через Event, корутине через future её цикла.
+    # Не реентерабельна; with внутри цикла событий блокирует весь цикл, пока блокировка занята
+    def __init__(self, stats:LockStats) -> None:
+        self.stats = stats
+        self.mutex = threading.Lock()
+        self.held = False
+        self.waiters = deque()
+        self.since = 0.0
+
+    def locked(self) -> bool:
+        return self.held
+
+    def acquired(self, start:float, contended:bool) -> None:
+        self.since = perf_counter()
+        self.stats.wait(self.since - start, contended)
+
+    def release(self) -> None:
+        self.stats.hold(perf_counter() - self.since)
+        self.handoff()
+
+    def handoff(self) -> None:
+        with self.mutex:
+            while self.waiters:
+                waiter = self.waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                try:
+                    waiter.get_loop().call_soon_threadsafe(self.wake, waiter)
+                    return
+                except RuntimeError:
+                    # Цикл ожидающего уже закрыт
+                    continue
+            self.held = False
+
+    def wake(self, future:asyncio.Future) -> None:
+        # Ожидающего успели отменить: передаём владение дальше
+        if future.cancelled():
+            self.handoff()
+        else:
+            future.set_result(True)
+
+    async def __aenter__(self):
+        start = perf_counter()
+        future = None
+        with self.mutex:
+            if self.held:
+                future = asyncio.get_running_loop().create_future()
+                self.waiters.append(future)
+            else:
+                self.held = True
+        if future is not None:
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self.mutex:
+                    if future in self.waiters:
+                        self.waiters.remove(future)
+                        raise
+                # Владение уже передано нам (иначе его передаст wake)
+                if future.done() and not future.cancelled():
+                    self.handoff()
+                raise
+        self.acquired(start, future is not None)
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.release()
+
+    def __enter__(self):
+        start = perf_counter()
+        event = None
+        with self.mutex:
+            if self.held:
+                event = threading.Event()
+                self.waiters.append(event)
+            else:
+                self.held = True
+        if event is not None:
+            event.wait()
+        self.acquired(start, event is not None)
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+class ManyLocks:
+    # Несколько шардов сразу, всегда в порядке возрастания номера, чтобы не было взаимных блокировок
+    def __init__(self, locks:list) -> None:
+        self.locks = locks
+
+    async def __aenter__(self):
+        entered = []
+        try:
+            for lock in self.locks:
+                await lock.__aenter__()
+                entered.append(lock)
+        except BaseException:
+            for lock in reversed(entered):
+                await lock.__aexit__(None, None, None)
+            raise
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        for lock in reversed(self.locks):
+            await lock.__aexit__(*args)
+
+class RWLock:
+    # Много читателей или один писатель; ждущий писатель не пропускает новых читателей
+    def __init__(self) -> None:
+        self.readers = 0
+        self.writer = False
+        self.writers_waiting = 0
+        self.condition = asyncio.Condition()
+
+    def locked(self) -> bool:
+        return self.writer or self.readers > 0 or self.writers_waiting > 0
+
+    async def acquire(self, write:bool) -> None:
+        async with self.condition:
+            if write:
+                self.writers_waiting += 1
+                try:
+                    await self.condition.wait_for(lambda: not self.writer and not self.readers)
+                finally:
+                    self.writers_waiting -= 1
+                self.writer = True
+            else:
+                await self.condition.wait_for(lambda: not self.writer and not self.writers_waiting)
+                self.readers += 1
+
+    async def release(self, write:bool) -> None:
+        async with self.condition:
+            if write:
+                self.writer = False
+            else:
+                self.readers -= 1
+            self.condition.notify_all()
+
+class KeyLock:
+    # Блокировка по ключу: запись в таблице живёт, пока есть владельцы или ожидающие
+    __slots__ = ("manager", "table", "key", "kind", "write", "entry", "since")
+
+    def __init__(self, manager, table:dict, key, kind:str, write:bool=True) -> None:
+        self.manager = manager
+        self.table = table
+        self.key = key
+        self.kind = kind
+        self.write = write
+        self.entry = None
+        self.since = 0.0
+
+    async def __aenter__(self):
+        entry = self.table.get(self.key)
+        if entry is None:
+            entry = self.table[self.key] = [asyncio.Lock() if self.kind == "key" else RWLock(), 0]
+        entry[1] += 1
+        self.entry = entry
+        start = perf_counter()
+        contended = entry[0].locked()
+        try:
+            if self.kind == "key":
+                await entry[0].acquire()
+            else:
+                await entry[0].acquire(self.write)
+        except BaseException:
+            self.unref()
+            raise
+        self.since = perf_counter()
+        self.manager.counters[self.kind].wait(self.since - start, contended)
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.manager.counters[self.kind].hold(perf_counter() - self.since)
+        try:
+            if self.kind == "key":
+                self.entry[0].release()
+            else:
+                await self.entry[0].release(self.write)
+        finally:
+            self.unref()
+
+    def unref(self) -> None:
+        self.entry[1] -= 1
+        if not self.entry[1] and self.table.get(self.key) is self.entry:
+            del self.table[self.key]
+
+class LockManager:
+    def __init__(self, shards:int=64) -> None:
+        self.counters = {kind: LockStats() for kind in ("this", "shard", "key", "read", "write")}
+        self.global_lock = SharedLock(self.counters["this"])
+        self.shards = [SharedLock(self.counters["shard"]) for _ in range(max(1, shards))]
+        self.keys = {}
+        self.rw_keys = {}
+
+    # this() - общая блокировка, this(*keys) - шард по хешу ключей: разные ключи не мешают друг другу
+    def this(self, *keys) -> SharedLock:
+        if not keys:
+            return self.global_lock
+        return self.shards[hash(keys) % len(self.shards)]
+
+    # Шарды для набора ключей (каждый ключ - кортеж, как аргументы this)
+    def many(self, keys:list) -> ManyLocks:
+        indices = sorted({hash(tuple(key)) % len(self.shards) for key in keys})
+        return ManyLocks([self.shards[index] for index in indices])
+
+    def get_lock_async(self, key) -> KeyLock:
+        return KeyLock(self, self.keys, key, "key")
+
+    def read(self, key=None) -> KeyLock:
+        return KeyLock(self, self.rw_keys, key, "read", write=False)
+
+    def write(self, key=None) -> KeyLock:
+        return KeyLock(self, self.rw_keys, key, "write", write=True)
+
+    def stats(self) -> dict:
+        stats = {kind: value.as_dict() for kind, value in self.counters.items()}
+        stats["key"]["active"] = len(self.keys)
+        stats["read"]["active"] = stats["write"]["active"] = len(self.rw_keys)
+        return stats
+
+    def reset_stats(self) -> None:
+        for value in self.counters.values():
+            value.reset()
+
+lock_manager = LockManager()
\ No newline at end of file
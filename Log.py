@@ -0,0 +1,59 @@
+import sys
+import json
+from datetime import datetime
+
+class Log:
+    # Leveled logging without side effects: lines go to whatever sys.stdout is at call time,
+    # so they reach the log file once the application installs LoggerAsync
+    levels = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+    level = 20
+    format = "text"
+
+    def configure(self, **options):
+        # level ("debug".."error") and format ("text" or "json") are set on the class, so they are
+        # shared by every Log: LoggerAsync().configure(...) also applies to the library's log
+        if "level" in options:
+            Log.level = self.levels[options.pop("level")]
+        if "format" in options:
+            Log.format = options.pop("format")
+        return options
+
+    def write(self, message):
+        if sys.stdout:
+            sys.stdout.write(message)
+
+    def enabled(self, level):
+        return self.levels[level] >= self.level
+
+    def log(self, level, msg, *args, **fields):
+        # Arguments are %-formatted only when the level is enabled
+        if self.levels[level] < self.level:
+            return
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError):
+                msg = f"{msg} {args}"
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        if self.format == "json":
+            line = json.dumps({"time": now, "level": level, "msg": msg, **fields}, ensure_ascii=False, default=str) + "\n"
+        else:
+            extra = "".join(f" {key}={value!r}" for key, value in fields.items())
+            line = f"[{now}] {level.upper()}: {msg}{extra}\n"
+        self.write(line)
+
+    def debug(self, msg, *args, **fields):
+        self.log("debug", msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log("info", msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        self.log("warning", msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        self.log("error", msg, *args, **fields)
+
+# Used by the library modules; importing it opens no files and leaves sys.stdout alone
+log = Log()
\ No newline at end of file
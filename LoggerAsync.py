@@ -1,8 +1,11 @@
 import sys
-import asyncio
-import aiofiles
+import time
+import queue
+import atexit
+import threading
 from datetime import datetime
 
+from .Log import Log
 from .LockManager import lock_manager
 
 class DummyStream:
@@ -12,17 +15,121 @@ class DummyStream:
     def flush(self, *args, **kwargs):
         pass
 
-class LoggerAsync:
+class LogPipeline:
+    # Bounded message queue drained by a single flusher thread that keeps the log file open
+    # and coalesces messages into one write per batch_bytes or per interval seconds.
+    # overflow: "block" waits for room, "drop" discards, "sample" keeps every sample_every-th message
+    def __init__(self, filename, max_queue=10000, batch_bytes=65536, interval=0.2, overflow="block", sample_every=10, errors=None):
+        self.filename = filename
+        self.queue = queue.Queue(max_queue)
+        self.batch_bytes = batch_bytes
+        self.interval = interval
+        self.overflow = overflow
+        self.sample_every = max(1, sample_every)
+        self.errors = errors if errors else DummyStream()
+        self.overflowed = 0
+        self.dropped = 0
+        self.closed = False
+        self.file = open(filename, 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self._run, name="LoggerAsync", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self, message):
+        if self.closed or not message:
+            return
+        if self.overflow == "block":
+            self.queue.put(message)
+            return
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed += 1
+            if self.overflow == "sample" and self.overflowed % self.sample_every == 0:
+                # Never block the caller: the sampled message is dropped too if there is still no room
+                try:
+                    self.queue.put_nowait(message)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        # Wait until everything queued so far is on disk
+        if self.closed or threading.current_thread() is self.thread:
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def _run(self):
+        running = True
+        while running:
+            item = self.queue.get()
+            chunks, events, size = [], [], 0
+            deadline = time.monotonic() + self.interval
+            while True:
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item, threading.Event):
+                    events.append(item)
+                    break
+                chunks.append(item)
+                size += len(item)
+                if size >= self.batch_bytes:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if not running:
+                # Drain whatever is left before closing
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        events.append(item)
+                    elif item:
+                        chunks.append(item)
+
+            if self.dropped:
+                chunks.append(f"\n[LoggerAsync: {self.dropped} messages dropped]\n")
+                self.dropped = 0
+            try:
+                if chunks:
+                    self.file.write("".join(chunks))
+                self.file.flush()
+            except Exception as e:
+                self.errors.write(f"LoggerAsync write failed: {e}\n")
+            for event in events:
+                event.set()
+
+class LoggerAsync(Log):
     _instance = None
 
-    def __new__(cls, filename="logfile.txt"):
+    def __new__(cls, filename="logfile.txt", **options):
         with lock_manager.this():
             if cls._instance is None:
                 cls._instance = super(LoggerAsync, cls).__new__(cls)
-                cls._instance.init(filename)
+                cls._instance.init(filename, **options)
         return cls._instance
 
-    def init(self, filename):
+    def init(self, filename, **options):
         # Use DummyStream if stdout or stderr are None
         self.stdout = sys.stdout if sys.stdout else DummyStream()
         self.stderr = sys.stderr if sys.stderr else DummyStream()
@@ -30,32 +137,39 @@ class LoggerAsync:
         sys.stderr = self
 
         self.filename = filename
+        self.pipeline = LogPipeline(filename, errors=self.stderr, **options)
 
         # Add the date and underscores to the log file
         date_line = f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]\n"
-        asyncio.run(self._write_async(date_line))
+        self.pipeline.put(date_line)
+
+    def configure(self, **options):
+        # level ("debug".."error") and format ("text" or "json") apply to the leveled API;
+        # the rest tunes the running pipeline: max_queue, batch_bytes, interval, overflow, sample_every
+        options = super().configure(**options)
+        if "max_queue" in options:
+            self.pipeline.queue.maxsize = options.pop("max_queue")
+        for key, value in options.items():
+            setattr(self.pipeline, key, value)
 
     def write(self, message):
         # Write to the terminal
         if self.stdout:
             self.stdout.write(message)
 
-        # Schedule the async write operation in the running event loop if available, else run it
-        try:
-            loop = asyncio.get_running_loop()
-            loop.create_task(self._write_async(message))
-        except RuntimeError:
-            asyncio.run(self._write_async(message))
+        # Hand the message to the flusher thread; never touches the event loop
+        self.pipeline.put(message)
 
     async def _write_async(self, message):
-        async with lock_manager.this():
-            async with aiofiles.open(self.filename, 'a', encoding='utf-8') as logfile:
-                await logfile.write(message)
+        self.pipeline.put(message)
 
     def flush(self):
         if self.stdout:
             self.stdout.flush()
 
+    def close(self):
+        self.pipeline.close()
+
     def __getattr__(self, attr):
         if self.stdout:
             return getattr(self.stdout, attr)
@@ -1,10 +1,398 @@
 import asyncio
 import aiosqlite
-import os, re, hashlib, json
+import sqlite3
+import re, hashlib, json, atexit
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
+from time import perf_counter
 from sortedcontainers import SortedDict
 
 from .LockManager import lock_manager
+from .Log import log
+
+class MDBAsyncCache:
+    # LRU-кэш сгенерированного SQL со счётчиками попаданий и промахов
+    def __init__(self, maxsize:int=512) -> None:
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.data[key]
+        except (KeyError, TypeError):
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize > 0:
+            try:
+                self.data[key] = value
+            except TypeError:
+                return value
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.data),
+            "maxsize": self.maxsize
+        }
+
+class MDBAsyncLease:
+    # Соединение, выданное пулом; close() возвращает его в пул
+    def __init__(self, pool, conn, write:bool) -> None:
+        self.pool = pool
+        self.conn = conn
+        self.write = write
+        self.cursors = []
+
+    async def cursor(self):
+        csr = await self.conn.cursor()
+        self.cursors.append(csr)
+        return csr
+
+    async def close(self) -> None:
+        if self.conn is None:
+            return
+        for csr in self.cursors:
+            await csr.close()
+        self.cursors = []
+        conn, self.conn = self.conn, None
+        await self.pool.release(conn, self.write)
+
+    def __getattr__(self, attr):
+        return getattr(self.conn, attr)
+
+class MDBAsyncPool:
+    # Пул соединений: до size читающих соединений и одно пишущее
+    def __init__(self, path:str, size:int=4, pragmas:dict|None=None, cached_statements:int=256) -> None:
+        self.path = path
+        self.size = max(1, size)
+        self.pragmas = pragmas or {}
+        # Кэш подготовленных выражений sqlite3 на каждом соединении
+        self.cached_statements = cached_statements
+        # Для базы в памяти у каждого соединения своя база, поэтому всё идёт через писателя
+        self.shared = path == ":memory:"
+        self.generation = 0
+        self.reset()
+
+    def reset(self) -> None:
+        self.idle = []
+        self.waiters = []
+        self.opened = 0
+        self.writer = None
+        self.writer_lock = asyncio.Lock()
+        self.generation += 1
+
+    async def connect(self):
+        conn = aiosqlite.connect(self.path, cached_statements=self.cached_statements)
+        # Соединения живут долго: не даём их потокам удерживать процесс при выходе
+        if hasattr(conn, "_thread"):
+            conn._thread.daemon = True
+        conn = await conn
+        try:
+            for pragma, value in self.pragmas.items():
+                await conn.execute(f"PRAGMA {pragma} = {value}")
+        except BaseException:
+            await conn.close()
+            raise
+        return conn
+
+    async def acquire_conn(self, write:bool=False):
+        if write or self.shared:
+            while True:
+                lock = self.writer_lock
+                await lock.acquire()
+                if lock is self.writer_lock:
+                    break
+                # Пул закрыли, пока мы ждали: блокировка устарела, встаём в очередь к новой
+                lock.release()
+            try:
+                if self.writer is None:
+                    self.writer = await self.connect()
+            except BaseException:
+                lock.release()
+                raise
+            # release отпускает именно ту блокировку, под которой соединение выдано
+            self.writer._writer_lock = lock
+            return self.writer
+
+        if self.idle:
+            return self.idle.pop()
+
+        if self.opened < self.size:
+            self.opened += 1
+            try:
+                return await self.connect()
+            except BaseException:
+                self.opened -= 1
+                raise
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                await self.release(waiter.result())
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    async def release(self, conn, write:bool=False) -> None:
+        if write or self.shared:
+            lock = getattr(conn, "_writer_lock", self.writer_lock)
+            try:
+                # Писатель закрытого пула
+                if conn is not self.writer:
+                    await conn.close()
+            finally:
+                lock.release()
+            return
+
+        if getattr(conn, "_pool_generation", self.generation) != self.generation:
+            await conn.close()
+            return
+
+        while self.waiters:
+            waiter = self.waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(conn)
+                return
+        self.idle.append(conn)
+
+    async def lease(self, write:bool=False) -> MDBAsyncLease:
+        conn = await self.acquire_conn(write)
+        if not (write or self.shared):
+            conn._pool_generation = self.generation
+        return MDBAsyncLease(self, conn, write or self.shared)
+
+    @asynccontextmanager
+    async def acquire(self, write:bool=False):
+        lease = await self.lease(write)
+        try:
+            yield lease
+        finally:
+            await lease.close()
+
+    async def aclose(self) -> None:
+        idle, writer, waiters = self.idle, self.writer, self.waiters
+        locked = self.writer_lock.locked()
+        self.reset()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(RuntimeError("Pool closed"))
+        for conn in idle:
+            await conn.close()
+        # Занятый писатель закроется при возврате в пул
+        if writer is not None and not locked:
+            await writer.close()
+
+class MDBAsyncQueryStats:
+    # Статистика одной формы запроса; времена в секундах
+    __slots__ = ("count", "errors", "total", "max", "rows", "pool_wait", "lock_wait", "histogram")
+
+    def __init__(self, buckets:int) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.pool_wait = 0.0
+        self.lock_wait = 0.0
+        self.histogram = [0] * (buckets + 1)
+
+    def as_dict(self, buckets:tuple) -> dict:
+        histogram = {f"<={bound}ms": n for bound, n in zip(buckets, self.histogram)}
+        histogram[f">{buckets[-1]}ms"] = self.histogram[-1]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": self.total * 1000,
+            "avg_ms": self.total * 1000 / self.count if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "rows": self.rows,
+            "pool_wait_ms": self.pool_wait * 1000,
+            "lock_wait_ms": self.lock_wait * 1000,
+            "histogram": histogram
+        }
+
+class MDBAsyncProfiledCursor:
+    # Курсор, который добавляет прочитанные строки в статистику запроса
+    def __init__(self, cursor, stats:MDBAsyncQueryStats) -> None:
+        self.cursor = cursor
+        self.stats = stats
+
+    async def fetchone(self):
+        row = await self.cursor.fetchone()
+        if row is not None:
+            self.stats.rows += 1
+        return row
+
+    async def fetchmany(self, size:int|None=None):
+        rows = await (self.cursor.fetchmany(size) if size is not None else self.cursor.fetchmany())
+        self.stats.rows += len(rows)
+        return rows
+
+    async def fetchall(self):
+        rows = await self.cursor.fetchall()
+        self.stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+class MDBAsyncProfiler:
+    # Профилировщик запросов. Статистика копится по форме SQL (литералы и списки параметров свёрнуты),
+    # медленные запросы пишутся в лог с EXPLAIN QUERY PLAN, каждое измерение уходит в callbacks.
+    # Выключенный профилировщик (profiler=None) стоит одну проверку на запрос
+    buckets = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+    literal_re = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+    params_re = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+    repeat_re = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+    space_re = re.compile(r"\s+")
+
+    def __init__(self, slow_ms:float=100, explain:bool=True, log_slow:bool=True, callbacks:list|None=None, shapes:int=1024, advisor:bool=False) -> None:
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.log_slow = log_slow
+        # Советник: медленные запросы с WHERE, которые читают таблицу целиком (SCAN в плане)
+        self.advisor = advisor
+        self.callbacks = list(callbacks or [])
+        self.shapes = MDBAsyncCache(shapes)
+        self.reset()
+
+    def reset(self) -> None:
+        self.queries = {}
+        self.locks = {}
+        self.plans = {}
+        self.advised = set()
+
+    # callback(event) получает словарь: shape, sql, seconds, rows, pool_wait, lock_wait, error, slow, plan
+    def add_callback(self, callback) -> None:
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback) -> None:
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def shape(self, sql:str) -> str:
+        shape = self.shapes.get(sql)
+        if shape is None:
+            shape = self.literal_re.sub("?", sql)
+            shape = self.params_re.sub("(?, ...)", shape)
+            shape = self.repeat_re.sub(r"\1, ...", shape)
+            shape = self.shapes.put(sql, self.space_re.sub(" ", shape).strip())
+        return shape
+
+    async def query_plan(self, shape:str, sql:str, params, conn) -> list|None:
+        if shape in self.plans:
+            return self.plans[shape]
+        if isinstance(params, list):
+            params = params[0] if params else None
+        try:
+            csr = await conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())
+            plan = [row[-1] for row in await csr.fetchall()]
+            await csr.close()
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {e}"]
+        self.plans[shape] = plan
+        return plan
+
+    # Учёт выполненного запроса; conn - соединение, на котором можно получить план
+    async def observe(self, sql:str, params, seconds:float, conn, rows:int=0, pool_wait:float=0.0, lock_wait:float=0.0, error:Exception|None=None) -> MDBAsyncQueryStats:
+        shape = self.shape(sql)
+        # rowcount равен -1 для DDL и SELECT
+        rows = max(rows, 0)
+        stats = self.queries.get(shape)
+        if stats is None:
+            stats = self.queries[shape] = MDBAsyncQueryStats(len(self.buckets))
+        stats.count += 1
+        stats.total += seconds
+        if seconds > stats.max:
+            stats.max = seconds
+        stats.rows += rows
+        stats.pool_wait += pool_wait
+        stats.lock_wait += lock_wait
+        if error is not None:
+            stats.errors += 1
+        stats.histogram[bisect_left(self.buckets, seconds * 1000)] += 1
+
+        slow = seconds * 1000 >= self.slow_ms
+        plan = None
+        if slow:
+            if self.explain or self.advisor:
+                plan = await self.query_plan(shape, sql, params, conn)
+            if self.log_slow:
+                log.warning("Slow query (%.1f ms): %s", seconds * 1000, shape, rows=rows, plan=plan)
+            if self.advisor and shape not in self.advised and self.full_scan(shape, plan):
+                self.advised.add(shape)
+                log.warning("No usable index (%.1f ms): %s", seconds * 1000, shape, plan=plan)
+
+        if self.callbacks:
+            event = {
+                "shape": shape,
+                "sql": sql,
+                "seconds": seconds,
+                "rows": rows,
+                "pool_wait": pool_wait,
+                "lock_wait": lock_wait,
+                "error": error,
+                "slow": slow,
+                "plan": plan
+            }
+            for callback in self.callbacks:
+                try:
+                    callback(event)
+                except Exception as e:
+                    log.error("Error (profiler callback): %s", e)
+        return stats
+
+    @staticmethod
+    def full_scan(shape:str, plan:list|None) -> bool:
+        if not plan or " WHERE " not in shape.upper():
+            return False
+        return any(line.startswith("SCAN ") and not line.startswith("SCAN CONSTANT") for line in plan)
+
+    # Ожидание блокировок уровня приложения (шарды set_obj и т.п.)
+    def observe_lock(self, name:str, seconds:float) -> None:
+        stats = self.locks.get(name)
+        if stats is None:
+            stats = self.locks[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+        if seconds > stats[2]:
+            stats[2] = seconds
+
+    # Формы запросов по убыванию суммарного времени (или другого поля as_dict)
+    def report(self, top:int|None=None, sort:str="total_ms") -> dict:
+        queries = [{"shape": shape, **stats.as_dict(self.buckets)} for shape, stats in self.queries.items()]
+        queries.sort(key=lambda item: item[sort], reverse=True)
+        return {
+            "queries": queries[:top] if top else queries,
+            "locks": {
+                name: {"count": count, "wait_ms": total * 1000, "max_ms": most * 1000}
+                for name, (count, total, most) in self.locks.items()
+            }
+        }
 
 class MDBAsync:
     time_format = "%Y-%m-%d %H:%M:%S"
@@ -50,10 +438,57 @@ class MDBAsync:
             },
             "constraint": {
                 "auth": ["auth"]
+            },
+            # Индексы: список столбцов или {"columns": [...], "where": "...", "unique": True}.
+            # В базе называются idx_<таблица>_<имя>
+            "indexes": {
+                "type_running": ["type", "running"],
+                "time_stamp": ["time_stamp"],
+                # Частичный индекс: запущенных аккаунтов обычно мало
+                "running": {
+                    "columns": ["running"],
+                    "where": "`running` != 0"
+                }
             }
         }
     }
     
+    # Профили хранения: PRAGMA, которые применяются к каждому соединению пула
+    storage_profiles = {
+        "default": {
+            "busy_timeout": 5000,
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -16000,
+            "mmap_size": 0,
+            "temp_store": "MEMORY"
+        },
+        # Каждый commit дожидается fsync
+        "durable": {
+            "busy_timeout": 5000,
+            "journal_mode": "WAL",
+            "synchronous": "FULL",
+            "cache_size": -16000,
+            "mmap_size": 0,
+            "temp_store": "MEMORY"
+        },
+        # Без fsync, с крупным кэшем и mmap: для импортов и временных баз
+        "fast": {
+            "busy_timeout": 5000,
+            "journal_mode": "WAL",
+            "synchronous": "OFF",
+            "cache_size": -65536,
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY"
+        },
+        # Поведение SQLite по умолчанию (журнал отката)
+        "legacy": {
+            "busy_timeout": 5000,
+            "journal_mode": "DELETE",
+            "synchronous": "FULL"
+        }
+    }
+
     @staticmethod
     def md5(string:str) -> str:
         return hashlib.md5(bytes(string, 'utf-8')).hexdigest()
@@ -62,11 +497,75 @@ class MDBAsync:
     def flt(num:float) -> float:
         return float(str(num)[0:7])
 
+    # Ограничение SQLite на число параметров в одном запросе
+    max_variables = 999
+
     db_column_names = {}
-    def __init__(self, path:str='Main.db') -> None:
+    # Синхронный конструктор поднимает свой цикл событий, поэтому внутри работающего цикла нужен open()
+    def __init__(self, path:str='Main.db', pool_size:int=4, storage:str|dict="default", sql_cache_size:int=512, profiler:MDBAsyncProfiler|bool|None=None, advisor:bool|float=False) -> None:
+        self.setup(path, pool_size, storage, sql_cache_size, profiler, advisor)
+        self.run(self.start())
+
+    # Создание в текущем цикле событий: db = await MDBAsync.open(path) или async with await MDBAsync.open(path) as db
+    @classmethod
+    async def open(cls, path:str='Main.db', **kwargs):
+        self = cls.__new__(cls)
+        self.setup(path, **kwargs)
+        try:
+            await self.start()
+        except BaseException:
+            await self.aclose()
+            raise
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    # Состояние без ввода-вывода
+    def setup(self, path:str='Main.db', pool_size:int=4, storage:str|dict="default", sql_cache_size:int=512, profiler:MDBAsyncProfiler|bool|None=None, advisor:bool|float=False) -> None:
         self.path = path
         self.db_column_names = {}
-        asyncio.run(self.connect())
+        self.sql_cache = MDBAsyncCache(sql_cache_size)
+        # profiler=True включает профилировщик с настройками по умолчанию
+        self.profiler = MDBAsyncProfiler() if profiler is True else (profiler or None)
+        # advisor=True (или порог в мс) сообщает о медленных условиях без подходящего индекса
+        if advisor is not False:
+            if self.profiler is None:
+                self.profiler = MDBAsyncProfiler(explain=False, log_slow=False)
+            self.profiler.advisor = True
+            if advisor is not True:
+                self.profiler.slow_ms = advisor
+        self.pragmas = self.storage_pragmas(storage)
+        self.pool = MDBAsyncPool(path, pool_size, self.pragmas)
+
+    async def start(self) -> None:
+        await self.connect()
+
+    # Выполняем корутину в отдельном цикле событий и закрываем пул, чтобы соединения не пережили цикл
+    def run(self, coro):
+        async def closing():
+            try:
+                return await coro
+            finally:
+                await self.pool.aclose()
+        return asyncio.run(closing())
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+    # Профиль по имени или словарь PRAGMA поверх профиля "default"
+    @classmethod
+    def storage_pragmas(cls, storage:str|dict="default") -> dict:
+        if isinstance(storage, dict):
+            return {**cls.storage_profiles["default"], **storage}
+        return dict(cls.storage_profiles[storage])
+
+    @staticmethod
+    def is_read(sql:str) -> bool:
+        return sql.lstrip()[:7].upper().startswith(("SELECT", "EXPLAIN"))
 
     def time_to_datetime(self, time):
         dt = datetime.fromtimestamp(time / 1000.0, tz=timezone.utc)
@@ -98,23 +597,47 @@ class MDBAsync:
                 rows_list  = self.indices + list(self.db_tables[table]["columns"].keys()) # ["id", ...]
                 self.db_column_names[table] = {value: index for index, value in enumerate(rows_list)}
 
-            if os.stat(self.path).st_size == 0:
-                await self.create_tables(self.db_tables)
+            await self.migrate(self.db_tables)
+
+            # Столбцы, добавленные миграцией, стоят в конце таблицы: позиции для SELECT * берём из самой базы
+            for table in self.db_tables.keys():
+                columns = await self.table_columns(table)
+                missing = [col for col in self.db_column_names[table] if col not in columns]
+                if missing:
+                    log.error("Error (connect): columns %s missing in %s", missing, table, path=self.path)
+                    continue
+                self.db_column_names[table] = {value: index for index, value in enumerate(columns)}
         except Exception as e:
-            print(f"Error (connect): {e}")
-            print("-" * 50)
+            log.error("Error (connect): %s", e, path=self.path)
 
     async def execute(self, sql:str, params:tuple|list|None=None, close=True) -> dict|None:
-        conn = await aiosqlite.connect(self.path)
+        write = not self.is_read(sql)
+        profiler = self.profiler
+        if profiler is not None:
+            start = perf_counter()
+        conn = await self.pool.lease(write)
+        if profiler is not None:
+            wait = perf_counter() - start
+            start += wait
         csr = await conn.cursor()
+        sett = None
+        error = None
         try:
             sett = await ((csr.executemany(sql, params) if isinstance(params, list) else csr.execute(sql, params)) if params else csr.execute(sql))
-            await conn.commit()
+            if write:
+                await conn.commit()
         except Exception as e:
-            print(sql)
-            print(f"Error (execute): {e}")
-            print("-" * 50)
+            error = e
+            if conn.in_transaction:
+                await conn.rollback()
+            log.error("Error (execute): %s", e, sql=sql)
         finally:
+            if profiler is not None:
+                # Ожидание писателя - это ожидание блокировки, читателя - свободного соединения
+                locked = write or self.pool.shared
+                stats = await profiler.observe(sql, params, perf_counter() - start, conn, rows=csr.rowcount if write else 0, pool_wait=0.0 if locked else wait, lock_wait=wait if locked else 0.0, error=error)
+                if sett is not None and not write:
+                    sett = MDBAsyncProfiledCursor(sett, stats)
             if close:
                 await conn.close()
             else:
@@ -132,13 +655,7 @@ class MDBAsync:
                 columns += f"`{ind}` INTEGER PRIMARY KEY"
 
             for column in db_tables[table]["columns"].keys():
-                _end = ""
-                if "required" in db_tables[table]['columns'][column]:
-                    _end = " NOT NULL"
-                elif "default" in db_tables[table]['columns'][column]:
-                    _end = f" DEFAULT {db_tables[table]['columns'][column]['default']}"
-
-                columns += f",`{column}` {db_tables[table]['columns'][column]['type']}{_end}"
+                columns += "," + self.column_sql(column, db_tables[table]["columns"][column])
 
             if "constraint" in db_tables[table]:
                 for constraint in db_tables[table]["constraint"].keys():
@@ -147,6 +664,90 @@ class MDBAsync:
             
             await self.execute(sql=f"CREATE TABLE IF NOT EXISTS `{table}` ({columns});")
 
+    @staticmethod
+    def column_sql(column:str, spec:dict) -> str:
+        _end = ""
+        if "required" in spec:
+            _end = " NOT NULL"
+        elif "default" in spec:
+            _end = f" DEFAULT {spec['default']}"
+        return f"`{column}` {spec['type']}{_end}"
+
+    # Приводим существующую базу к db_tables: таблицы, недостающие столбцы и индексы. Повторный запуск ничего не меняет
+    async def migrate(self, db_tables:dict) -> None:
+        await self.create_tables(db_tables)
+        await self.add_columns(db_tables)
+        await self.create_indexes(db_tables)
+
+    # {столбец: DEFAULT из схемы базы}
+    async def table_columns(self, table:str) -> dict:
+        async with self.pool.acquire(write=True) as conn:
+            csr = await conn.execute(f"PRAGMA table_info(`{table}`)")
+            rows = await csr.fetchall()
+            await csr.close()
+        return {row[1]: row[4] for row in rows}
+
+    # ALTER TABLE ADD COLUMN не принимает неконстантный DEFAULT и NOT NULL без DEFAULT:
+    # такие столбцы добавляются без них; CURRENT_* заполняется у существующих строк,
+    # а у новых - триггером, раз DEFAULT в схеме столбца нет
+    async def add_columns(self, db_tables:dict) -> None:
+        for table in db_tables.keys():
+            existing = await self.table_columns(table)
+            for column, spec in db_tables[table]["columns"].items():
+                default = spec.get("default")
+                dynamic = isinstance(default, str) and (default.upper().startswith("CURRENT_") or "(" in default)
+                if column in existing:
+                    # Столбец добавлен прошлой миграцией
+                    if dynamic and existing[column] is None:
+                        await self.create_default_trigger(table, column, default)
+                    continue
+
+                if "required" in spec or dynamic:
+                    await self.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {spec['type']}")
+                    if dynamic:
+                        await self.execute(f"UPDATE `{table}` SET `{column}` = {default}")
+                        await self.create_default_trigger(table, column, default)
+                    if "required" in spec:
+                        log.warning("Column %s.%s added without NOT NULL", table, column)
+                else:
+                    await self.execute(f"ALTER TABLE `{table}` ADD COLUMN {self.column_sql(column, spec)}")
+
+    async def create_default_trigger(self, table:str, column:str, default:str) -> None:
+        ind = self.indices[0]
+        await self.execute(
+            f"CREATE TRIGGER IF NOT EXISTS `{table}_{column}_default` AFTER INSERT ON `{table}` WHEN NEW.`{column}` IS NULL "
+            f"BEGIN UPDATE `{table}` SET `{column}` = {default} WHERE `{ind}` = NEW.`{ind}`; END;"
+        )
+
+    async def create_indexes(self, db_tables:dict) -> None:
+        for table in db_tables.keys():
+            for name, index in db_tables[table].get("indexes", {}).items():
+                if isinstance(index, dict):
+                    columns, where, unique = index["columns"], index.get("where"), index.get("unique", False)
+                else:
+                    columns, where, unique = index, None, False
+
+                columns = ", ".join(f"`{col}`" for col in columns)
+                where = f" WHERE {where}" if where else ""
+                unique = "UNIQUE " if unique else ""
+                await self.execute(f"CREATE {unique}INDEX IF NOT EXISTS `idx_{table}_{name}` ON `{table}` ({columns}){where}")
+
+    # Хешируемая форма аргумента для ключа кэша SQL
+    @staticmethod
+    def shape(value):
+        if isinstance(value, dict):
+            return tuple(value.items())
+        if isinstance(value, list):
+            return tuple(value)
+        return value
+
+    # Форма условий: ключи и длина IN-списков, без значений
+    @staticmethod
+    def where_shape(wheres:dict|None):
+        if not wheres:
+            return None
+        return tuple((k, len(v)) if isinstance(v, list) else k for k, v in wheres.items())
+
     # COLUMNS
     def c(self, table_name:str, columns:str|dict|list|None=None) -> dict:
         if not columns:
@@ -154,7 +755,12 @@ class MDBAsync:
                 "select": "*",
                 "indices": self.db_column_names[table_name]
             }
-        
+
+        key = ("c", table_name, self.shape(columns))
+        cached = self.sql_cache.get(key)
+        if cached is not None:
+            return cached
+
         columnss = {}
         columns2 = ''
 
@@ -174,10 +780,10 @@ class MDBAsync:
             formatted_col = ' '.join(f"`{v}`" if not re.search(r'[\.\(\)]+', v) else v for v in spcol)
             columnss[spcol[-1]] = formatted_col
 
-        return {
+        return self.sql_cache.put(key, {
             "select": ','.join(columnss.values()),
             "indices": {value: index for index, value in enumerate(columnss.keys())}
-        }
+        })
 
     # SET
     def s(self, sets:str|dict|None=None) -> dict|None:
@@ -200,19 +806,29 @@ class MDBAsync:
             return {"sql": "", "params": ()}
 
         conditions = []
-        params = []
         for k, v in wheres.items():
             if isinstance(v, list):
                 placeholders = ",".join(["?"] * len(v))
                 conditions.append(f"`{k}` IN ({placeholders})")
-                params.extend(v)
             else:
                 conditions.append(f"`{k}` = ?")
-                params.append(v)
         return {
             "sql": f" WHERE {' AND '.join(conditions)}",
-            "params": tuple(params)
+            "params": self.w_params(wheres)
         }
+
+    @staticmethod
+    def w_params(wheres:dict|None=None) -> tuple:
+        if not wheres:
+            return ()
+
+        params = []
+        for v in wheres.values():
+            if isinstance(v, list):
+                params.extend(v)
+            else:
+                params.append(v)
+        return tuple(params)
     
     # ORDER BY
     def o(self, orders:dict={}) -> str:
@@ -231,13 +847,18 @@ class MDBAsync:
     
     # cur.execute("SELECT * FROM `test` WHERE `p` = ?", (1,))
     def select(self, table_name:str, columns:str|dict|list|None=None, wheres:str|dict|None=None, orders:dict={}, limit:list|int=[]) -> dict:
+        key = ("select", table_name, self.shape(columns), self.where_shape(wheres), self.shape(orders), self.shape(limit))
+        sql = self.sql_cache.get(key)
+        if sql is not None:
+            return {"sql": sql, "params": self.w_params(wheres)}
+
         columns = self.c(table_name, columns)
         wheres = self.w(wheres)
         orders = self.o(orders)
         limit = self.l(limit)
 
         return {
-            "sql": f"SELECT {columns['select']} FROM `{table_name}`{wheres['sql']}{orders}{limit}",
+            "sql": self.sql_cache.put(key, f"SELECT {columns['select']} FROM `{table_name}`{wheres['sql']}{orders}{limit}"),
             "params": wheres['params']
         }
     
@@ -247,6 +868,58 @@ class MDBAsync:
             execute = await self.execute(sql=select["sql"], params=select["params"], close=close)
             return None if execute is None else {**execute, **self.c(table_name, columns)}
     
+    # Построчный обход выборки пачками по batch_size строк без загрузки всей таблицы в память.
+    # keyset=True читает страницами по id (orders игнорируется), отдавая соединение между страницами
+    async def iter_rows(self, table_name:str, columns:str|dict|list|None=None, wheres:str|dict|None=None, orders:dict={}, batch_size:int=1000, keyset:bool=False, as_dict:bool=True):
+        if table_name not in self.db_column_names:
+            return
+
+        if not keyset:
+            indices = self.c(table_name, columns)["indices"]
+            select = self.select(table_name, columns, wheres, orders)
+            async with self.pool.acquire() as conn:
+                csr = await conn.cursor()
+                start = perf_counter()
+                await csr.execute(select["sql"], select["params"])
+                if self.profiler is not None:
+                    csr = MDBAsyncProfiledCursor(csr, await self.profiler.observe(select["sql"], select["params"], perf_counter() - start, conn))
+                while rows := await csr.fetchmany(batch_size):
+                    for row in rows:
+                        yield {key: row[index] for key, index in indices.items()} if as_dict else row
+            return
+
+        ind = self.indices[0]
+        # Для страниц по ключу id обязан быть в выборке: добавляем его последним столбцом
+        if columns and ind not in self.c(table_name, columns)["indices"]:
+            columns = self.c(table_name, columns)["select"] + f",`{ind}`"
+        cols = self.c(table_name, columns)
+        position = cols["indices"][ind]
+
+        key = ("keyset", table_name, self.shape(columns), self.where_shape(wheres), batch_size)
+        sql = self.sql_cache.get(key)
+        if sql is None:
+            where = self.w(wheres)["sql"]
+            where = f"{where} AND" if where else " WHERE"
+            sql = self.sql_cache.put(key, f"SELECT {cols['select']} FROM `{table_name}`{where} `{ind}` > ? ORDER BY `{ind}` LIMIT {batch_size}")
+
+        params = self.w_params(wheres)
+        last = -(2 ** 63)
+        while True:
+            async with self.pool.acquire() as conn:
+                csr = await conn.cursor()
+                start = perf_counter()
+                await csr.execute(sql, params + (last,))
+                rows = await csr.fetchall()
+                if self.profiler is not None:
+                    await self.profiler.observe(sql, params + (last,), perf_counter() - start, conn, rows=len(rows))
+            if not rows:
+                return
+            for row in rows:
+                yield {key: row[index] for key, index in cols["indices"].items()} if as_dict else row
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][position]
+
     async def addrows(self, table_name:str, values:list=[], ids=False) -> None:
         if table_name not in self.db_column_names or not values:
             return
@@ -263,17 +936,74 @@ class MDBAsync:
         query = f"INSERT OR IGNORE INTO `{table_name}` (`{keys_str}`) VALUES ({placeholders})"
 
         if ids is not False:
-            obj = await self.execute(sql=query, params=params, close=False)
-            ids.append((await obj["set"]).lastrowid)
-            await obj["conn"].close()
+            # id всех вставленных строк (пропущенные OR IGNORE в результат не попадают)
+            ids.extend(await self.returning(table_name, keys, params, "INSERT OR IGNORE") or [])
             return ids
         
         await self.execute(sql=query, params=params)
 
+    # Пакетная вставка или обновление по конфликту уникальных столбцов одной транзакцией.
+    # Возвращает id всех затронутых строк (None при ошибке)
+    async def upsert_rows(self, table_name:str, rows:list, conflict_cols:list|None=None, update_cols:list|None=None) -> list|None:
+        if table_name not in self.db_column_names or not rows:
+            return []
+
+        keys = [key for key in rows[0] if key in self.db_column_names[table_name] and key not in self.indices]
+        if conflict_cols is None:
+            conflict_cols = next(iter(self.db_tables[table_name]["constraint"].values()))
+        if update_cols is None:
+            update_cols = [key for key in keys if key not in conflict_cols]
+        # Пустое обновление, чтобы RETURNING вернул id и для уже существующих строк
+        if not update_cols:
+            update_cols = conflict_cols[:1]
+
+        conflict_str = "`, `".join(conflict_cols)
+        updates = ", ".join(f"`{col}` = excluded.`{col}`" for col in update_cols)
+        params = [tuple(d[key] for key in keys) for d in rows]
+        return await self.returning(table_name, keys, params, "INSERT", f" ON CONFLICT (`{conflict_str}`) DO UPDATE SET {updates}")
+
+    # Многострочный INSERT ... RETURNING id пачками в пределах max_variables параметров
+    async def returning(self, table_name:str, keys:list, params:list, insert:str="INSERT", conflict:str="") -> list|None:
+        if not keys or not params:
+            return []
+
+        ind = self.indices[0]
+        keys_str = "`, `".join(keys)
+        placeholders = "(" + ", ".join(["?"] * len(keys)) + ")"
+        size = max(1, self.max_variables // len(keys))
+        ids = []
+        sql = None
+
+        async with self.pool.acquire(write=True) as conn:
+            try:
+                for i in range(0, len(params), size):
+                    chunk = params[i:i + size]
+                    key = ("returning", table_name, insert, tuple(keys), conflict, len(chunk))
+                    sql = self.sql_cache.get(key)
+                    if sql is None:
+                        values = ", ".join([placeholders] * len(chunk))
+                        sql = self.sql_cache.put(key, f"{insert} INTO `{table_name}` (`{keys_str}`) VALUES {values}{conflict} RETURNING `{ind}`")
+                    start = perf_counter()
+                    values = tuple(value for row in chunk for value in row)
+                    csr = await conn.execute(sql, values)
+                    rows = await csr.fetchall()
+                    await csr.close()
+                    if self.profiler is not None:
+                        await self.profiler.observe(sql, values, perf_counter() - start, conn, rows=len(rows))
+                    ids.extend(row[0] for row in rows)
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                log.error("Error (returning): %s", e, sql=sql)
+                return None
+        return ids
+
     async def delrows(self, table_name:str, wheres=None, limit:list|int=[]):
-        wheres = self.w(wheres)
-        limit = self.l(limit)
-        await self.execute(f"DELETE FROM `{table_name}`{wheres['sql']}{limit};", wheres['params'])
+        key = ("delete", table_name, self.where_shape(wheres), self.shape(limit))
+        sql = self.sql_cache.get(key)
+        if sql is None:
+            sql = self.sql_cache.put(key, f"DELETE FROM `{table_name}`{self.w(wheres)['sql']}{self.l(limit)};")
+        await self.execute(sql, self.w_params(wheres))
 
     async def setone(self, table_name:str, sets:dict, wheres:dict=None):
         if table_name in self.db_column_names:
@@ -293,10 +1023,12 @@ class MDBAsync:
                 if ind in assoc:
                     del assoc[ind]
 
-            sets = self.s(assoc)
-            wheres = self.w(wheres)
-            if sets:
-                await self.execute(f"UPDATE `{table_name}` SET {sets['sql']}{wheres['sql']}", sets['params'] + wheres['params'])
+            if assoc:
+                key = ("update", table_name, tuple(assoc), self.where_shape(wheres))
+                sql = self.sql_cache.get(key)
+                if sql is None:
+                    sql = self.sql_cache.put(key, f"UPDATE `{table_name}` SET {self.s(assoc)['sql']}{self.w(wheres)['sql']}")
+                await self.execute(sql, tuple(assoc.values()) + self.w_params(wheres))
             return True
 
     async def getone(self, table_name:str, columns:str|dict|list|None=None, wheres:str|dict|None=None, orders:dict={}) -> dict|None:
@@ -312,12 +1044,357 @@ class MDBAsync:
                 await obj["conn"].close()
             return assoc
 
+class MDBAsyncRecord:
+    # Компактная строка кэша: значения лежат в __slots__, JSON разбирается при первом обращении.
+    # Классы под каждую таблицу создаёт record_class; слоты названы по номеру столбца,
+    # чтобы имена столбцов не пересекались с методами
+    __slots__ = ()
+    fields = ()
+    slots = {}
+
+    @classmethod
+    def record_class(cls, name:str, fields:list) -> type:
+        slots = {field: f"s{index}" for index, field in enumerate(fields)}
+        return type(name, (cls,), {"__slots__": tuple(slots.values()), "fields": tuple(fields), "slots": slots})
+
+    @classmethod
+    def from_row(cls, indices:dict, row):
+        record = cls.__new__(cls)
+        for key, index in indices.items():
+            setattr(record, cls.slots[key], row[index])
+        return record
+
+    @classmethod
+    def from_obj(cls, obj:dict):
+        record = cls.__new__(cls)
+        for key, value in obj.items():
+            setattr(record, cls.slots[key], value)
+        return record
+
+    def __getitem__(self, key):
+        try:
+            slot = self.slots[key]
+            value = getattr(self, slot)
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+        # Те же преобразования, что и loads_obj, но только для строк, которые он может изменить
+        if isinstance(value, str) and value and (value[0] in "{[" or value[0].isspace() or value[-1].isspace()):
+            decoded = MDBAsyncObj.loads_obj(value)
+            if decoded is not value:
+                setattr(self, slot, decoded)
+            return decoded
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        setattr(self, self.slots[key], value)
+
+    def __delitem__(self, key) -> None:
+        try:
+            delattr(self, self.slots[key])
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key) -> bool:
+        return key in self.slots and hasattr(self, self.slots[key])
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (MDBAsyncRecord, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> list:
+        return [field for field in self.fields if hasattr(self, self.slots[field])]
+
+    def values(self) -> list:
+        return [self[key] for key in self.keys()]
+
+    def items(self) -> list:
+        return [(key, self[key]) for key in self.keys()]
+
+    def update(self, obj:dict) -> None:
+        for key, value in obj.items():
+            self[key] = value
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    copy = to_dict
+
 class MDBAsyncObj(MDBAsync):
-    def __init__(self, path:str='Main.db') -> None:
-        super().__init__(path)
-        asyncio.run(self.update_obj())
+    # Журнал изменений, который заполняют триггеры при track_changes
+    changes_table = "obj_changes"
+    # Сколько последних записей журнала хранить; старые удаляются при refresh_obj
+    changes_keep = 100000
+
+    # Вторичные индексы кэша для find(): "hash" для равенства, "sorted" для диапазонов
+    secondary_obj = {
+        "accounts": {
+            "type": "hash",
+            "running": "hash",
+            "basic": "hash",
+            "time_stamp": "sorted"
+        }
+    }
+
+    def __init__(self, path:str='Main.db', pool_size:int=4, storage:str|dict="default", sql_cache_size:int=512, write_behind:bool=False, batch_size:int=500, batch_delay:float=0.05, track_changes:bool=False, compact:bool=False, profiler:MDBAsyncProfiler|bool|None=None, advisor:bool|float=False) -> None:
+        self.setup(path, pool_size, storage, sql_cache_size, write_behind, batch_size, batch_delay, track_changes, compact, profiler, advisor)
+        self.run(self.start())
+
+    def setup(self, path:str='Main.db', pool_size:int=4, storage:str|dict="default", sql_cache_size:int=512, write_behind:bool=False, batch_size:int=500, batch_delay:float=0.05, track_changes:bool=False, compact:bool=False, profiler:MDBAsyncProfiler|bool|None=None, advisor:bool|float=False) -> None:
+        super().setup(path, pool_size, storage, sql_cache_size, profiler, advisor)
+        # Отложенная запись: set_obj только обновляет кэш, строки пишутся пачками в фоне
+        self.write_behind = write_behind
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay
+        self.pending = {}
+        self.pending_count = 0
+        # Строки, которые не удалось записать: {"table", "row", "wheres", "error"}
+        self.write_errors = deque(maxlen=1000)
+        self.flush_task = None
+        self.flush_event = None
+        # flush_sync при выходе регистрируется с первой отложенной строкой и снимается в aclose
+        self.flush_registered = False
+
+        # Инкрементальное обновление кэша по журналу изменений
+        self.track_changes = track_changes
+        self.change_id = 0
+        self.obj_ids = {}
+        self.refresh_task = None
+
+        # Компактное хранение строк кэша в MDBAsyncRecord вместо dict
+        self.compact = compact
+        self.records = {}
+
+        self.obj = {}
+        self.obj_indexes = {}
         self.updating_obj = False
 
+    async def start(self) -> None:
+        await super().start()
+        if self.track_changes:
+            await self.create_changes()
+        if self.compact:
+            for table in self.db_tables:
+                self.records[table] = MDBAsyncRecord.record_class(f"{table}_record", list(self.db_column_names[table]))
+        await self.update_obj()
+
+    async def aclose(self) -> None:
+        self.stop_refresh()
+        await self.flush()
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        if self.flush_registered:
+            atexit.unregister(self.flush_sync)
+            self.flush_registered = False
+        await super().aclose()
+
+    async def write_row(self, t:str, row:dict, wheres:dict|None=None) -> None:
+        if not self.write_behind:
+            if wheres is None:
+                await self.addrows(t, [row])
+            else:
+                await self.setone(t, row, wheres=wheres)
+            return
+
+        # Повторные изменения одной строки до записи сливаются в одно
+        pending = self.pending.setdefault(t, {})
+        key = tuple(row.get(col) for col in self.obj_columns(t))
+        if key in pending:
+            pending[key]["row"].update(row)
+        else:
+            pending[key] = {"row": dict(row), "wheres": wheres}
+            self.pending_count += 1
+
+        if self.pending_count >= self.batch_size and self.flush_event:
+            self.flush_event.set()
+        if not self.flush_registered:
+            atexit.register(self.flush_sync)
+            self.flush_registered = True
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_loop())
+
+    async def flush_loop(self) -> None:
+        self.flush_event = asyncio.Event()
+        while self.pending_count:
+            if self.pending_count < self.batch_size:
+                try:
+                    await asyncio.wait_for(self.flush_event.wait(), self.batch_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self.flush_event.clear()
+            await self.write_pending()
+
+    # Забираем из очереди не больше batch_size строк
+    def take_pending(self) -> list:
+        taken = []
+        for t in list(self.pending):
+            pending = self.pending[t]
+            while pending and len(taken) < self.batch_size:
+                key = next(iter(pending))
+                taken.append((t, key, pending.pop(key)))
+            if not pending:
+                del self.pending[t]
+            if len(taken) >= self.batch_size:
+                break
+        self.pending_count -= len(taken)
+        return taken
+
+    # Возвращаем незаписанные строки в очередь, не затирая более свежие изменения
+    def requeue_pending(self, taken:list) -> None:
+        for t, key, entry in taken:
+            pending = self.pending.setdefault(t, {})
+            if key in pending:
+                pending[key]["row"] = {**entry["row"], **pending[key]["row"]}
+                if entry["wheres"] is None:
+                    pending[key]["wheres"] = None
+            else:
+                pending[key] = entry
+                self.pending_count += 1
+
+    # Группируем строки по SQL для executemany
+    def pending_statements(self, taken:list) -> dict:
+        statements = {}
+        for t, _, entry in taken:
+            statement = self.pending_statement(t, entry)
+            if statement:
+                statements.setdefault(statement[0], []).append(statement[1])
+        return statements
+
+    def pending_statement(self, t:str, entry:dict) -> tuple|None:
+        row = {k: v for k, v in entry["row"].items() if k in self.db_column_names[t] and k not in self.indices}
+        if not row:
+            return
+        if entry["wheres"] is None:
+            keys_str = "`, `".join(row)
+            placeholders = ", ".join(["?"] * len(row))
+            return f"INSERT OR IGNORE INTO `{t}` (`{keys_str}`) VALUES ({placeholders})", tuple(row.values())
+
+        sets = self.s(row)
+        wheres = self.w(entry["wheres"])
+        return f"UPDATE `{t}` SET {sets['sql']}{wheres['sql']}", sets['params'] + wheres['params']
+
+    async def write_pending(self) -> None:
+        taken = self.take_pending()
+        if not taken:
+            return
+        failed = []
+        try:
+            async with self.pool.acquire(write=True) as conn:
+                try:
+                    try:
+                        for sql, params in self.pending_statements(taken).items():
+                            start = perf_counter()
+                            csr = await conn.executemany(sql, params)
+                            if self.profiler is not None:
+                                await self.profiler.observe(sql, params, perf_counter() - start, conn, rows=csr.rowcount)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception:
+                        # Ошибка одной строки откатывает всю пачку: повторяем построчно, пропуская ошибочные
+                        await conn.rollback()
+                        for t, _, entry in taken:
+                            statement = self.pending_statement(t, entry)
+                            if not statement:
+                                continue
+                            try:
+                                await conn.execute(*statement)
+                            except sqlite3.Error as e:
+                                failed.append((t, entry, e))
+                    await conn.commit()
+                except asyncio.CancelledError:
+                    if conn.in_transaction:
+                        await conn.rollback()
+                    raise
+                except Exception as e:
+                    await conn.rollback()
+                    failed = [(t, entry, e) for t, _, entry in taken]
+        except asyncio.CancelledError:
+            # Цикл событий останавливается: пачку допишет flush_sync
+            self.requeue_pending(taken)
+            raise
+
+        for t, entry, e in failed:
+            self.write_failed(t, entry, e)
+            # Кэш уже содержит незаписанную строку: возвращаем в него данные из базы
+            col, _ = self.obj_key(t)
+            if col in entry["row"]:
+                await self.reload_obj(t, entry["row"][col])
+
+    def write_failed(self, t:str, entry:dict, error:Exception) -> None:
+        log.error("Error (write_pending): %s", error, table=t, row=entry["row"])
+        self.write_errors.append({"table": t, "row": entry["row"], "wheres": entry["wheres"], "error": error})
+
+    # Перечитываем из базы строки одного ключа кэша
+    async def reload_obj(self, table:str, key) -> None:
+        col, _ = self.obj_key(table)
+        obj = await self.sqlobj(table, wheres={col: key}, close=False)
+        rows = []
+        if obj:
+            if "set" in obj and obj["set"]:
+                rows = await obj["set"].fetchall()
+            await obj["conn"].close()
+        self.index_obj(table, key, add=False)
+        value = self.obj[table].pop(key, None)
+        ids = self.obj_ids.get(table, {})
+        for row in value if isinstance(value, list) else (value,) if value is not None else ():
+            ids.pop(row.get(self.indices[0]), None)
+        for row in rows:
+            self.put_obj(table, self.row_obj(obj["indices"], row, table))
+
+    async def flush(self) -> None:
+        while self.pending_count:
+            await self.write_pending()
+        # Дожидаемся пачки, которую фоновая задача уже пишет
+        async with self.pool.acquire(write=True):
+            pass
+
+    # Дописываем очередь при завершении процесса, когда цикла событий уже нет
+    def flush_sync(self) -> None:
+        if not self.pending_count or self.pool.shared:
+            return
+        conn = sqlite3.connect(self.path, timeout=self.pragmas.get("busy_timeout", 5000) / 1000)
+        try:
+            while self.pending_count:
+                taken = self.take_pending()
+                try:
+                    for sql, params in self.pending_statements(taken).items():
+                        conn.executemany(sql, params)
+                except sqlite3.Error:
+                    conn.rollback()
+                    for t, _, entry in taken:
+                        statement = self.pending_statement(t, entry)
+                        if not statement:
+                            continue
+                        try:
+                            conn.execute(*statement)
+                        except sqlite3.Error as e:
+                            self.write_failed(t, entry, e)
+                conn.commit()
+        except Exception as e:
+            log.error("Error (flush_sync): %s", e)
+        finally:
+            conn.close()
+
+    def obj_columns(self, t:str) -> list:
+        ind = self.indices_obj[t] if hasattr(self, "indices_obj") and t in self.indices_obj else next(iter(self.db_tables[t]["constraint"].keys()))
+        return ind["columns"] if isinstance(ind, dict) else self.db_tables[t]["constraint"][ind]
+
     @staticmethod # Сравниваем второй обьект с первым
     def compare_objs(obj0:dict, obj1:dict) -> bool:
         for k in obj1:
@@ -341,39 +1418,306 @@ class MDBAsyncObj(MDBAsync):
     def dumps_obj(obj):
         return json.dumps(obj) if isinstance(obj, (list|dict)) else obj
 
+    async def create_changes(self) -> None:
+        ind = self.indices[0]
+        await self.execute(f"CREATE TABLE IF NOT EXISTS `{self.changes_table}` (`id` INTEGER PRIMARY KEY AUTOINCREMENT, `tbl` TEXT NOT NULL, `row_id` INTEGER NOT NULL, `op` TEXT NOT NULL);")
+        for table in self.db_tables:
+            for event, op, ref in (("INSERT", "I", "NEW"), ("UPDATE", "U", "NEW"), ("DELETE", "D", "OLD")):
+                await self.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS `{table}_{self.changes_table}_{op}` AFTER {event} ON `{table}` "
+                    f"BEGIN INSERT INTO `{self.changes_table}` (`tbl`, `row_id`, `op`) VALUES ('{table}', {ref}.`{ind}`, '{op}'); END;"
+                )
+
+    # Удаляем старые записи журнала, оставляя последние keep
+    async def prune_changes(self, keep:int|None=None) -> None:
+        await self.execute(f"DELETE FROM `{self.changes_table}` WHERE `id` <= (SELECT MAX(`id`) FROM `{self.changes_table}`) - ?", (self.changes_keep if keep is None else keep,))
+
+    async def last_change(self) -> dict:
+        obj = await self.execute(f"SELECT MIN(`id`), MAX(`id`) FROM `{self.changes_table}`", close=False)
+        row = await obj["set"].fetchone() if obj["set"] else None
+        await obj["conn"].close()
+        return {} if row is None else {"min": row[0], "max": row[1]}
+
+    def row_obj(self, indices:dict, row, table:str|None=None) -> dict:
+        if table in self.records and indices.keys() <= self.records[table].slots.keys():
+            return self.records[table].from_row(indices, row)
+        return {key: self.loads_obj(row[index]) for key, index in indices.items()}
+
+    # Строка для кэша: запись MDBAsyncRecord в компактном режиме, если все ключи известны таблице
+    def compact_obj(self, table:str, obj):
+        if table not in self.records:
+            return obj
+        if isinstance(obj, list):
+            return [self.compact_obj(table, v) for v in obj]
+        if isinstance(obj, dict) and obj.keys() <= self.records[table].slots.keys():
+            return self.records[table].from_obj(obj)
+        return obj
+
+    # Ключ строки в кэше и признак списочного индекса
+    def obj_key(self, table:str) -> tuple:
+        if hasattr(self, "indices_obj") and table in self.indices_obj:
+            ind = self.indices_obj[table]
+            return ind["columns"][0], "type" in ind and ind["type"] == list
+        # next с итератором, не требующий создания списка, будет быстрее
+        return next(iter(self.db_tables[table]["constraint"].keys())), False
+
+    def put_obj(self, table:str, assoc:dict) -> None:
+        col, is_list = self.obj_key(table)
+        key = assoc[col]
+        row_id = assoc.get(self.indices[0])
+
+        if self.track_changes:
+            ids = self.obj_ids.setdefault(table, {})
+            if row_id in ids:
+                if ids[row_id] != key or is_list:
+                    self.drop_obj(table, row_id)
+            if row_id is not None:
+                ids[row_id] = key
+
+        if is_list:
+            if not key in self.obj[table]:
+                self.obj[table][key] = []
+            self.obj[table][key].append(assoc)
+            self.index_obj(table, key, rows=(assoc,))
+        else:
+            self.store_obj(table, key, assoc)
+
+    def drop_obj(self, table:str, row_id:int) -> None:
+        key = self.obj_ids.get(table, {}).pop(row_id, None)
+        if key is None or key not in self.obj[table]:
+            return
+        ind = self.indices[0]
+        value = self.obj[table][key]
+        if isinstance(value, list):
+            self.index_obj(table, key, add=False)
+            value[:] = [v for v in value if v.get(ind) != row_id]
+            if not value:
+                del self.obj[table][key]
+            else:
+                self.index_obj(table, key)
+        elif value.get(ind, row_id) == row_id:
+            self.index_obj(table, key, add=False)
+            del self.obj[table][key]
+
+    # Заменяем значение ключа в кэше вместе с записями вторичных индексов
+    def store_obj(self, table:str, key, value) -> None:
+        self.index_obj(table, key, add=False)
+        self.obj[table][key] = value
+        self.index_obj(table, key)
+
+    def index_obj(self, table:str, key, add:bool=True, rows=None) -> None:
+        indexes = self.obj_indexes.get(table)
+        if not indexes:
+            return
+        if rows is None:
+            if key not in self.obj[table]:
+                return
+            value = self.obj[table][key]
+            rows = value if isinstance(value, list) else (value,)
+
+        for row in rows:
+            for column, store in indexes.items():
+                value = row.get(column)
+                try:
+                    if add:
+                        if isinstance(store, SortedDict):
+                            if value is None:
+                                continue
+                            # Несравнимые значения не должны попасть в SortedDict
+                            store.bisect_left(value)
+                        store.setdefault(value, set()).add(key)
+                    elif value in store:
+                        keys = store[value]
+                        keys.discard(key)
+                        if not keys:
+                            del store[value]
+                except TypeError:
+                    pass
+
+    # Поиск по кэшу без обращения к базе: find("accounts", running=1, type=["a", "b"], time_stamp=slice(start, stop)).
+    # Список значений работает как IN, slice как диапазон [start, stop); индексированные столбцы сужают перебор
+    def find(self, table:str, **wheres) -> list:
+        if table not in self.obj:
+            return []
+
+        candidates = None
+        indexes = self.obj_indexes.get(table, {})
+        for column, value in wheres.items():
+            if column not in indexes:
+                continue
+            store = indexes[column]
+            keys = set()
+            try:
+                if isinstance(value, slice):
+                    if not isinstance(store, SortedDict):
+                        continue
+                    for v in store.irange(value.start, value.stop, inclusive=(True, False)):
+                        keys |= store[v]
+                else:
+                    for v in value if isinstance(value, list) else [value]:
+                        keys |= store.get(v, set())
+            except TypeError:
+                return []
+            candidates = keys if candidates is None else candidates & keys
+            if not candidates:
+                return []
+
+        result = []
+        for key in self.obj[table].keys() if candidates is None else sorted(candidates):
+            value = self.obj[table][key]
+            for row in value if isinstance(value, list) else (value,):
+                if self.match_obj(row, wheres):
+                    result.append(row)
+        return result
+
+    @staticmethod
+    def match_obj(row, wheres:dict) -> bool:
+        for column, value in wheres.items():
+            v = row.get(column)
+            try:
+                if isinstance(value, slice):
+                    if v is None or (value.start is not None and v < value.start) or (value.stop is not None and v >= value.stop):
+                        return False
+                elif isinstance(value, list):
+                    if v not in value:
+                        return False
+                elif v != value:
+                    return False
+            except TypeError:
+                return False
+        return True
+
     async def update_obj(self):
+        if self.track_changes:
+            # Позицию журнала запоминаем до чтения, чтобы не потерять изменения во время загрузки
+            bounds = await self.last_change()
+            self.change_id = bounds.get("max") or 0
+            if self.change_id and self.change_id - bounds["min"] >= self.changes_keep:
+                await self.prune_changes()
         self.obj = {}
+        self.obj_ids = {}
+        self.obj_indexes = {
+            table: {column: SortedDict() if kind == "sorted" else {} for column, kind in self.secondary_obj[table].items()}
+            for table in self.db_tables if table in self.secondary_obj
+        }
         for table in self.db_tables:
             self.obj[table] = SortedDict()
-            obj = await self.sqlobj(table, close=False)
-            if obj:
-                if "set" in obj and obj["set"]:
-                    for row in await obj["set"].fetchall():
-                        assoc = {}
-                        for key in obj["indices"].keys():
-                            col = row[obj["indices"][key]]
-                            assoc[key] = self.loads_obj(col)
-
-                        if hasattr(self, "indices_obj") and table in self.indices_obj:
-                            ind = self.indices_obj[table]
-                            col = ind["columns"][0]
-                            if "type" in ind and ind["type"] == list:
-                                if not assoc[col] in self.obj[table]:
-                                    self.obj[table][assoc[col]] = []
-                                self.obj[table][assoc[col]].append(assoc)
-                            else:
-                                self.obj[table][assoc[col]] = assoc
-                        else:
-                            # next с итератором, не требующий создания списка, будет быстрее
-                            key = next(iter(self.db_tables[table]["constraint"].keys()))
-                            self.obj[table][assoc[key]] = assoc
+        # Таблицы читаются одновременно, каждая на своём соединении пула
+        await asyncio.gather(*(self.load_obj(table) for table in self.db_tables))
+
+    async def load_obj(self, table:str) -> None:
+        obj = await self.sqlobj(table, close=False)
+        if obj:
+            if "set" in obj and obj["set"]:
+                for row in await obj["set"].fetchall():
+                    self.put_obj(table, self.row_obj(obj["indices"], row, table))
+            await obj["conn"].close()
+
+    # Подтягиваем в кэш только строки, изменённые после последней синхронизации
+    async def refresh_obj(self) -> bool:
+        if not self.track_changes:
+            await self.update_obj()
+            return True
+
+        bounds = await self.last_change()
+        if not bounds.get("max") or bounds["max"] <= self.change_id:
+            return False
+        # Журнал обрезан дальше нашей позиции: частичное обновление невозможно
+        if bounds["min"] > self.change_id + 1:
+            await self.update_obj()
+            return True
+
+        obj = await self.execute(f"SELECT `id`, `tbl`, `row_id`, `op` FROM `{self.changes_table}` WHERE `id` > ? ORDER BY `id`", (self.change_id,), close=False)
+        changes = await obj["set"].fetchall() if obj["set"] else []
+        await obj["conn"].close()
+        if not changes:
+            return False
+
+        changed = {}
+        for change_id, table, row_id, op in changes:
+            if table not in self.obj:
+                continue
+            changed.setdefault(table, {})[row_id] = op
+
+        ind = self.indices[0]
+        for table, ops in changed.items():
+            pending = self.pending.get(table, {})
+            col, is_list = self.obj_key(table)
+            # Списки строк по ключу перечитываются целиком: строки, записанные set_obj, не знают своих id
+            keys = set()
+            ids = [row_id for row_id, op in ops.items() if op != "D"]
+            for row_id, op in ops.items():
+                if op == "D":
+                    if is_list and row_id in self.obj_ids.get(table, {}):
+                        keys.add(self.obj_ids[table][row_id])
+                    else:
+                        self.drop_obj(table, row_id)
+
+            # Ограничение SQLite на число параметров запроса
+            for i in range(0, len(ids), 900):
+                obj = await self.sqlobj(table, wheres={ind: ids[i:i + 900]}, close=False)
+                if not obj:
+                    continue
+                found = set()
+                for row in await obj["set"].fetchall() if obj["set"] else []:
+                    assoc = self.row_obj(obj["indices"], row, table)
+                    found.add(assoc[ind])
+                    # Строки, ждущие отложенной записи, в кэше новее базы
+                    if tuple(assoc.get(c) for c in self.obj_columns(table)) in pending:
+                        continue
+                    if is_list:
+                        keys.add(assoc[col])
+                    else:
+                        self.put_obj(table, assoc)
                 await obj["conn"].close()
+                for row_id in ids[i:i + 900]:
+                    if row_id not in found:
+                        if is_list and row_id in self.obj_ids.get(table, {}):
+                            keys.add(self.obj_ids[table][row_id])
+                        else:
+                            self.drop_obj(table, row_id)
+
+            for key in keys:
+                await self.reload_obj(table, key)
+
+        self.change_id = changes[-1][0]
+        if bounds["max"] - bounds["min"] >= self.changes_keep:
+            await self.prune_changes()
+        return True
+
+    def start_refresh(self, interval:float=1.0) -> None:
+        async def refreshing():
+            while True:
+                try:
+                    await self.refresh_obj()
+                except Exception as e:
+                    log.error("Error (refresh_obj): %s", e)
+                await asyncio.sleep(interval)
+
+        self.stop_refresh()
+        self.refresh_task = asyncio.get_running_loop().create_task(refreshing())
+
+    def stop_refresh(self) -> None:
+        if self.refresh_task:
+            self.refresh_task.cancel()
+            self.refresh_task = None
+
+    # Шард блокировки по (таблица, ключ): записи разных ключей не ждут друг друга
+    def lock_key(self, t:str, obj) -> tuple:
+        col, is_list = self.obj_key(t)
+        try:
+            return t, (obj[0] if is_list else obj)[col]
+        except (KeyError, IndexError, TypeError):
+            return t, None
 
     async def set_obj(self, t:str, obj:dict):
-        async with lock_manager.this():
-            if t not in self.db_tables:
-                return
-            
+        if t not in self.db_tables:
+            return
+
+        start = perf_counter() if self.profiler is not None else 0.0
+        async with lock_manager.this(*self.lock_key(t, obj)):
+            if self.profiler is not None:
+                self.profiler.observe_lock("set_obj", perf_counter() - start)
             try:
                 ind = self.indices_obj[t] if hasattr(self, "indices_obj") and t in self.indices_obj else next(iter(self.db_tables[t]["constraint"].keys()))
                 col = ind["columns"][0] if isinstance(ind, dict) else ind
@@ -388,9 +1732,9 @@ class MDBAsyncObj(MDBAsync):
 
                         if col in self.obj[t] and k in self.obj[t][col]:
                             if self.compare_objs(self.obj[t][col][k], v):
-                                await self.setone(t, v, wheres={key: value for key, value in v.items() if key in ind["columns"]})
+                                await self.write_row(t, v, wheres={key: value for key, value in v.items() if key in ind["columns"]})
                         else:
-                            await self.addrows(t, [v])
+                            await self.write_row(t, v)
                 else:
                     key = obj[col]
                     _obj = dict(obj)
@@ -400,17 +1744,48 @@ class MDBAsyncObj(MDBAsync):
 
                     if key in self.obj[t]:
                         if self.compare_objs(self.obj[t][key], _obj):
-                            await self.setone(t, _obj, wheres={key: value for key, value in _obj.items() if key in ind["columns"]})
+                            columns = self.obj_columns(t)
+                            await self.write_row(t, _obj, wheres={key: value for key, value in _obj.items() if key in columns})
                     else:
-                        await self.addrows(t, [_obj])
+                        await self.write_row(t, _obj)
                 
                 # Обновляем SortedDict данные
-                self.obj[t][key] = obj
+                self.store_obj(t, key, self.compact_obj(t, obj))
             except Exception as e:
-                print("ind", ind)
-                print("col", col)
-                
-                print(f"Error (set_obj): {e}")
-                print("|" * 50)
-                print(obj)
-                print("-" * 50)
\ No newline at end of file
+                log.error("Error (set_obj): %s", e, ind=ind, col=col, obj=obj)
+
+    # Пакетный set_obj: строки пишутся через upsert_rows одним запросом на пачку, затем обновляется кэш.
+    # Для списочных индексов (obj - список строк) остаётся построчный set_obj
+    async def set_objs(self, t:str, objs:list) -> list|None:
+        if t not in self.db_tables or not objs:
+            return
+
+        col, is_list = self.obj_key(t)
+        if is_list:
+            for obj in objs:
+                await self.set_obj(t, obj)
+            return
+
+        start = perf_counter() if self.profiler is not None else 0.0
+        async with lock_manager.many([self.lock_key(t, obj) for obj in objs]):
+            if self.profiler is not None:
+                self.profiler.observe_lock("set_objs", perf_counter() - start)
+            try:
+                columns = self.obj_columns(t)
+                pending = self.pending.get(t, {})
+                rows = []
+                for obj in objs:
+                    rows.append({n: self.dumps_obj(v) for n, v in obj.items()})
+                    # Отложенная запись этой строки устарела
+                    if pending.pop(tuple(obj.get(c) for c in columns), None) is not None:
+                        self.pending_count -= 1
+
+                ids = await self.upsert_rows(t, rows, columns)
+                if ids is None:
+                    return
+
+                for obj in objs:
+                    self.store_obj(t, obj[col], self.compact_obj(t, obj))
+                return ids
+            except Exception as e:
+                log.error("Error (set_objs): %s", e)
\ No newline at end of file
@@ -1,8 +1,16 @@
 import os
+import errno
 import shutil
 import asyncio
+import hashlib
+import tempfile
 
 class ShutilAsync:
+    # Сколько файлов переносится за один переход в поток
+    chunk_size = 256
+    # Размер блока при копировании между устройствами
+    copy_block = 8 * 1024 * 1024
+
     @staticmethod
     async def move(src:str, dst:str):
         src_directory, src_filename = os.path.split(src)
@@ -24,4 +32,276 @@ class ShutilAsync:
         if os.path.exists(path_to):
             await asyncio.to_thread(os.remove, path_to)
 
-        await asyncio.to_thread(shutil.move, src, dst)
\ No newline at end of file
+        await asyncio.to_thread(shutil.move, src, dst)
+
+    # Путь назначения по правилам move: dst с расширением - файл, иначе каталог
+    @staticmethod
+    def target(src:str, dst:str) -> str|None:
+        if not os.path.splitext(src)[1]:
+            return
+        if os.path.splitext(os.path.basename(dst))[1]:
+            return dst
+        return os.path.join(dst, os.path.basename(src))
+
+    # Копирование ядром без буферов Python: copy_file_range, затем sendfile, затем обычное чтение
+    @classmethod
+    def copy_file(cls, src:str, dst:str) -> int:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            copied = 0
+            for name in ("copy_file_range", "sendfile"):
+                fn = getattr(os, name, None)
+                if fn is None:
+                    continue
+                try:
+                    while copied < size:
+                        if name == "sendfile":
+                            sent = fn(fdst.fileno(), fsrc.fileno(), copied, cls.copy_block)
+                        else:
+                            sent = fn(fsrc.fileno(), fdst.fileno(), cls.copy_block, copied, copied)
+                        if not sent:
+                            break
+                        copied += sent
+                    if copied >= size:
+                        break
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EBADF):
+                        raise
+            else:
+                fsrc.seek(copied)
+                fdst.seek(copied)
+                shutil.copyfileobj(fsrc, fdst, cls.copy_block)
+                copied = size
+        shutil.copystat(src, dst)
+        return copied
+
+    @classmethod
+    def move_file(cls, src:str, dst:str) -> str:
+        try:
+            # Тот же раздел: атомарное переименование с перезаписью
+            os.replace(src, dst)
+            return "rename"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        # Другое устройство: копия с заменой и удаление источника
+        cls.copy_replace(src, dst)
+        os.remove(src)
+        return "copy"
+
+    # Копия в уникальный временный файл рядом с dst и атомарная замена
+    @classmethod
+    def copy_replace(cls, src:str, dst:str) -> int:
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dst)), prefix=f".{os.path.basename(dst)}.", suffix=".part")
+        os.close(fd)
+        try:
+            copied = cls.copy_file(src, temp)
+            os.replace(temp, dst)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        return copied
+
+    @classmethod
+    def move_chunk(cls, directory:str, items:list) -> list:
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            return [(src, dst, e) for src, dst in items]
+
+        results = []
+        for src, dst in items:
+            try:
+                results.append((src, dst, cls.move_file(src, dst)))
+            except OSError as e:
+                results.append((src, dst, e))
+        return results
+
+    # Пакетный перенос: каталоги назначения создаются один раз, файлы переносятся пачками
+    # в concurrency потоках. Результат по каждой паре: "rename", "copy", "skip" или исключение
+    @classmethod
+    async def move_many(cls, pairs:list, concurrency:int=8) -> list:
+        results = {}
+        groups = {}
+        for index, (src, dst) in enumerate(pairs):
+            path_to = cls.target(src, dst)
+            if path_to is None or os.path.abspath(path_to) == os.path.abspath(src):
+                results[index] = (src, dst, "skip")
+                continue
+            groups.setdefault(os.path.dirname(path_to) or ".", []).append((index, src, path_to))
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(directory:str, chunk:list):
+            async with semaphore:
+                moved = await asyncio.to_thread(cls.move_chunk, directory, [(src, path_to) for _, src, path_to in chunk])
+            for (index, _, _), result in zip(chunk, moved):
+                results[index] = result
+
+        await asyncio.gather(*(
+            run(directory, items[i:i + cls.chunk_size])
+            for directory, items in groups.items()
+            for i in range(0, len(items), cls.chunk_size)
+        ))
+        return [results[index] for index in range(len(pairs))]
+
+    # Снимок дерева: {относительный путь файла: (size, mtime_ns)} и множество каталогов
+    @staticmethod
+    def scan(root:str) -> tuple:
+        files, dirs = {}, set()
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            try:
+                entries = os.scandir(os.path.join(root, rel))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with entries:
+                for entry in entries:
+                    path = os.path.join(rel, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.add(path)
+                        stack.append(path)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[path] = (stat.st_size, stat.st_mtime_ns)
+        return files, dirs
+
+    @staticmethod
+    def file_hash(path:str) -> str:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "blake2b").hexdigest()
+
+    @classmethod
+    def sync_file(cls, src:str, dst:str, checksum:bool) -> str:
+        if checksum and os.path.exists(dst) and cls.file_hash(src) == cls.file_hash(dst):
+            return "skip"
+        cls.copy_replace(src, dst)
+        return "copy"
+
+    # Создаём каталоги src в dst; возвращаем события (event, path, error).
+    # Файл на месте каталога при delete=True удаляется как лишний, иначе путь отмечается ошибкой
+    @staticmethod
+    def make_dirs(dst:str, dirs:list, delete:bool=False) -> list:
+        events = []
+        failed = []
+        for rel in [""] + dirs:
+            # Внутри каталога, который не удалось создать, ошибки уже известны
+            if any(rel.startswith(path + os.sep) for path in failed):
+                continue
+            path = os.path.join(dst, rel)
+            try:
+                if os.path.lexists(path) and not os.path.isdir(path):
+                    if not delete:
+                        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+                    os.remove(path)
+                    events.append(("delete", rel, None))
+                if not os.path.isdir(path):
+                    os.makedirs(path, exist_ok=True)
+                    events.append(("mkdir", rel, None))
+            except OSError as e:
+                failed.append(rel)
+                events.append(("error", rel, e))
+        return events
+
+    # Лежит ли путь внутри одного из каталогов paths ("" - корень)
+    @staticmethod
+    def inside(rel:str, paths:list) -> bool:
+        return any(not path or rel.startswith(path + os.sep) for path in paths)
+
+    @staticmethod
+    def remove_paths(dst:str, files:list, dirs:list) -> list:
+        removed = []
+        for rel in files:
+            os.remove(os.path.join(dst, rel))
+            removed.append(rel)
+        # Сначала самые глубокие каталоги
+        for rel in sorted(dirs, key=lambda rel: rel.count(os.sep), reverse=True):
+            shutil.rmtree(os.path.join(dst, rel), ignore_errors=True)
+            removed.append(rel)
+        return removed
+
+    # Синхронизация дерева src в dst с событиями прогресса {"event", "path", "bytes"}.
+    # Файлы с теми же размером и mtime (или хешем при checksum=True) пропускаются,
+    # изменённые копируются в concurrency потоков; delete=True удаляет лишнее в dst
+    @classmethod
+    async def sync(cls, src:str, dst:str, concurrency:int=8, checksum:bool=False, delete:bool=False):
+        (src_files, src_dirs), (dst_files, dst_dirs) = await asyncio.gather(
+            asyncio.to_thread(cls.scan, src),
+            asyncio.to_thread(cls.scan, dst)
+        )
+
+        failed = []
+        for event, rel, error in await asyncio.to_thread(cls.make_dirs, dst, sorted(src_dirs), delete):
+            if event == "delete":
+                dst_files.pop(rel, None)
+            elif event == "error":
+                failed.append(rel)
+            yield {"event": event, "path": rel, "bytes": 0, **({"error": error} if error else {})}
+
+        # Каталог dst на месте файла src при delete=True удаляется как лишний
+        conflicts = [rel for rel in src_files if rel in dst_dirs]
+        if delete and conflicts:
+            for rel in await asyncio.to_thread(cls.remove_paths, dst, [], conflicts):
+                yield {"event": "delete", "path": rel, "bytes": 0}
+            dst_files = {rel: stat for rel, stat in dst_files.items() if not cls.inside(rel, conflicts)}
+            dst_dirs = {rel for rel in dst_dirs if rel not in conflicts and not cls.inside(rel, conflicts)}
+
+        changed = []
+        for rel, stat in src_files.items():
+            # Каталог для файла создать не удалось: ошибка уже выдана
+            if failed and cls.inside(rel, failed):
+                continue
+            have = dst_files.get(rel)
+            if have is not None and have[0] == stat[0] and (checksum or have[1] == stat[1]):
+                if not checksum:
+                    yield {"event": "skip", "path": rel, "bytes": 0}
+                    continue
+            changed.append(rel)
+
+        queue = asyncio.Queue()
+        pending = iter(changed)
+
+        async def worker():
+            # Общий итератор: каждый файл достаётся одному обработчику
+            for rel in pending:
+                try:
+                    # В режиме checksum файлы другого размера копируем без хеширования
+                    same_size = rel in dst_files and dst_files[rel][0] == src_files[rel][0]
+                    result = await asyncio.to_thread(cls.sync_file, os.path.join(src, rel), os.path.join(dst, rel), checksum and same_size)
+                    await queue.put({"event": result, "path": rel, "bytes": src_files[rel][0] if result == "copy" else 0})
+                except OSError as e:
+                    await queue.put({"event": "error", "path": rel, "bytes": 0, "error": e})
+            await queue.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        try:
+            running = len(workers)
+            while running:
+                event = await queue.get()
+                if event is None:
+                    running -= 1
+                    continue
+                yield event
+        finally:
+            for task in workers:
+                task.cancel()
+
+        if delete:
+            extra_files = [rel for rel in dst_files if rel not in src_files]
+            extra_dirs = [rel for rel in dst_dirs if rel not in src_dirs]
+            try:
+                for rel in await asyncio.to_thread(cls.remove_paths, dst, extra_files, extra_dirs):
+                    yield {"event": "delete", "path": rel, "bytes": 0}
+            except OSError as e:
+                yield {"event": "error", "path": dst, "bytes": 0, "error": e}
+
+    # copytree поверх sync: возвращает число событий каждого типа и объём скопированного
+    @classmethod
+    async def copytree(cls, src:str, dst:str, concurrency:int=8, checksum:bool=False, delete:bool=False) -> dict:
+        summary = {"mkdir": 0, "copy": 0, "skip": 0, "delete": 0, "error": 0, "bytes": 0}
+        async for event in cls.sync(src, dst, concurrency, checksum, delete):
+            summary[event["event"]] += 1
+            summary["bytes"] += event["bytes"]
+        return summary
\ No newline at end of file
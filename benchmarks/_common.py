@@ -0,0 +1,50 @@
+import os, sys, json, time, argparse, asyncio, importlib, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+sys.path.insert(0, os.path.dirname(ROOT))
+
+def module(name:str):
+    # Модули пакета используют относительные импорты, поэтому грузим их как часть пакета
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+def metric(value:float, unit:str, higher:bool=True) -> dict:
+    return {"value": round(value, 6), "unit": unit, "higher": higher}
+
+def ops(count:int, seconds:float) -> dict:
+    return metric(count / seconds if seconds else 0.0, "ops/s")
+
+def latency(samples:list) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        "p50": metric(samples[len(samples) // 2] * 1000, "ms", False),
+        "p95": metric(samples[int(len(samples) * 0.95) - 1 if len(samples) > 1 else 0] * 1000, "ms", False),
+        "max": metric(samples[-1] * 1000, "ms", False),
+    }
+
+def tempdir(prefix:str="bench-", base:str|None=None) -> tempfile.TemporaryDirectory:
+    return tempfile.TemporaryDirectory(prefix=prefix, dir=base)
+
+class timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.start
+
+def main(bench, n:int) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=None)
+    # Множитель размера по умолчанию (run.py --scale) и файл для результатов вместо stdout
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+    results = asyncio.run(bench(args.n or max(1, int(n * args.scale))))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False)
+    else:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
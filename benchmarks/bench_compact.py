@@ -0,0 +1,47 @@
+# Память кэша MDBAsyncObj: строки-словари против компактных MDBAsyncRecord (tracemalloc)
+import os, gc, tracemalloc
+
+from sortedcontainers import SortedDict
+
+import _common
+
+MDBAsyncObj = _common.module("MDBAsync").MDBAsyncObj
+
+def synthetic(n:int) -> list:
+    # Столбцы в порядке db_column_names: id, basic, type, name, auth, running, error, time_stamp
+    return [
+        (i, 0, "bot", f"name-{i}", f"auth-{i:032x}", i % 2, f'{{"code": {i % 7}, "retry": [1, 2, 3]}}', "2024-01-01 00:00:00")
+        for i in range(1, n + 1)
+    ]
+
+def load(db:MDBAsyncObj, rows:list) -> tuple:
+    indices = db.db_column_names["accounts"]
+    gc.collect()
+    tracemalloc.start()
+    with _common.timer() as t:
+        db.obj = {"accounts": SortedDict()}
+        for row in rows:
+            db.put_obj("accounts", db.row_obj(indices, row, "accounts"))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, t.elapsed
+
+async def bench(n:int) -> dict:
+    results = {}
+    rows = synthetic(n)
+    with _common.tempdir() as tmp:
+        for name, compact in (("dict", False), ("compact", True)):
+            db = await MDBAsyncObj.open(os.path.join(tmp, f"{name}.db"), compact=compact)
+            size, elapsed = load(db, rows)
+            with _common.timer() as t:
+                for value in db.obj["accounts"].values():
+                    value["error"]
+            results[f"{name}.bytes_per_row"] = _common.metric(size / n, "B", False)
+            results[f"{name}.load"] = _common.ops(n, elapsed)
+            results[f"{name}.first_access"] = _common.ops(n, t.elapsed)
+            db.obj = {}
+            await db.aclose()
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 1000000)
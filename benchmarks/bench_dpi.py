@@ -0,0 +1,76 @@
+# DPIAsync: пакетные get_many/set_many на общем пуле против get/set в цикле
+import os, asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import _common
+
+DPIAsync = _common.module("DPIAsync").DPIAsync
+
+def fixtures(directory:str, n:int) -> list:
+    paths = []
+    for i in range(n):
+        path = os.path.join(directory, f"img{i}.{'jpg' if i % 2 else 'png'}")
+        Image.new("RGB", (64, 64), (i % 256, 80, 160)).save(path, dpi=(72, 72))
+        paths.append(path)
+    return paths
+
+async def legacy_set(image_path:str, dpi:tuple) -> None:
+    # Прежний DPIAsync.set: открытие на цикле событий и новый пул потоков на каждый вызов
+    with Image.open(image_path) as img:
+        if not img.info.get('dpi') == dpi:
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor() as pool:
+                await loop.run_in_executor(pool, lambda: img.save(image_path, dpi=dpi, quality=100))
+
+async def bench(n:int) -> dict:
+    results = {}
+    with _common.tempdir() as tmp:
+        paths = await asyncio.to_thread(fixtures, tmp, n)
+
+        def pil_get():
+            for path in paths:
+                with Image.open(path) as img:
+                    img.info.get('dpi')
+        with _common.timer() as t:
+            await asyncio.to_thread(pil_get)
+        results["pil.get"] = _common.ops(n, t.elapsed)
+
+        with _common.timer() as t:
+            for path in paths:
+                await DPIAsync.get(path)
+        results["loop.get"] = _common.ops(n, t.elapsed)
+
+        DPIAsync.cache.clear()
+        with _common.timer() as t:
+            await DPIAsync.get_many(paths)
+        results["batch.get"] = _common.ops(n, t.elapsed)
+
+        with _common.timer() as t:
+            await DPIAsync.get_many(paths)
+        results["batch.get_cached"] = _common.ops(n, t.elapsed)
+
+        with _common.timer() as t:
+            for path in paths:
+                await legacy_set(path, (100, 100))
+        results["legacy.set"] = _common.ops(n, t.elapsed)
+
+        with _common.timer() as t:
+            for path in paths:
+                await DPIAsync.set(path, 300)
+        results["loop.set"] = _common.ops(n, t.elapsed)
+
+        with _common.timer() as t:
+            await DPIAsync.set_many(paths, 150)
+        results["batch.set"] = _common.ops(n, t.elapsed)
+
+        DPIAsync.configure(processes=True)
+        with _common.timer() as t:
+            await DPIAsync.set_many(paths, 200)
+        results["batch.set_processes"] = _common.ops(n, t.elapsed)
+    DPIAsync.configure()
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 2000)
@@ -0,0 +1,43 @@
+# DPIAsync.set: правка заголовка против перекодирования через PIL; заодно проверяем, что пиксели не меняются
+import os, asyncio
+
+from PIL import Image
+
+import _common
+
+DPIAsync = _common.module("DPIAsync").DPIAsync
+
+def fixtures(directory:str, n:int, ext:str) -> list:
+    img = Image.effect_noise((1024, 768), 64).convert("RGB")
+    paths = []
+    for i in range(n):
+        path = os.path.join(directory, f"img{i}.{ext}")
+        img.save(path, dpi=(72, 72))
+        paths.append(path)
+    return paths
+
+def pixels(paths:list) -> list:
+    result = []
+    for path in paths:
+        with Image.open(path) as img:
+            result.append(img.tobytes())
+    return result
+
+async def bench(n:int) -> dict:
+    results = {}
+    for ext in ("jpg", "png", "tif"):
+        for name, lossless in (("reencode", False), ("patch", True)):
+            with _common.tempdir() as tmp:
+                paths = await asyncio.to_thread(fixtures, tmp, n, ext)
+                before = await asyncio.to_thread(pixels, paths)
+                DPIAsync.configure(lossless=lossless)
+                with _common.timer() as t:
+                    await DPIAsync.set_many(paths, 300)
+                results[f"{ext}.{name}"] = _common.ops(n, t.elapsed)
+                if lossless and await asyncio.to_thread(pixels, paths) != before:
+                    raise AssertionError(f"{ext}: pixel data changed by header patch")
+    DPIAsync.configure()
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 100)
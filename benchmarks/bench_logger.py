@@ -0,0 +1,50 @@
+# Пропускная способность LoggerAsync: очередь с потоком записи против открытия файла на каждое сообщение
+import os, sys, asyncio, aiofiles
+
+import _common
+
+async def legacy_write(filename:str, message:str) -> None:
+    # Прежний путь _write_async: открытие файла в режиме дозаписи на каждое сообщение
+    async with aiofiles.open(filename, 'a', encoding='utf-8') as logfile:
+        await logfile.write(message)
+
+async def bench(n:int) -> dict:
+    results = {}
+    message = "x" * 80 + "\n"
+    cwd = os.getcwd()
+    with _common.tempdir() as tmp:
+        os.chdir(tmp)
+        try:
+            module = _common.module("LoggerAsync")
+            # Модуль подменяет stdout при импорте; результаты печатаем в настоящий stdout
+            sys.stdout, sys.stderr = module.logger.stdout, module.logger.stderr
+
+            filename = os.path.join(tmp, "legacy.txt")
+            count = min(n, 5000)
+            with _common.timer() as t:
+                for _ in range(count):
+                    await legacy_write(filename, message)
+            results["legacy.in_loop"] = _common.ops(count, t.elapsed)
+
+            def legacy_sync():
+                for _ in range(count):
+                    asyncio.run(legacy_write(filename, message))
+            with _common.timer() as t:
+                await asyncio.to_thread(legacy_sync)
+            results["legacy.no_loop"] = _common.ops(count, t.elapsed)
+
+            for overflow in ("block", "drop"):
+                pipeline = module.LogPipeline(os.path.join(tmp, f"{overflow}.txt"), overflow=overflow)
+                with _common.timer() as t:
+                    for _ in range(n):
+                        pipeline.put(message)
+                    pipeline.flush()
+                results[f"pipeline.{overflow}"] = _common.ops(n, t.elapsed)
+                pipeline.close()
+        finally:
+            module.logger.close()
+            os.chdir(cwd)
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 100000)
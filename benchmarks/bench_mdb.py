@@ -0,0 +1,49 @@
+# MDBAsyncObj: задержка одиночных getone/setone/set_obj и пропускная способность 1000 корутин со смешанной нагрузкой
+import os, asyncio
+from time import perf_counter
+from itertools import count
+
+import _common
+
+MDBAsyncObj = _common.module("MDBAsync").MDBAsyncObj
+
+ACCOUNTS = 1000
+COROUTINES = 1000
+
+def operations(db:MDBAsyncObj) -> dict:
+    # свой name на каждый вызов, иначе set_obj совпадает с засеянной строкой и ничего не пишет
+    seq = count()
+    return {
+        "getone": lambda i: db.getone("accounts", ["id", "name"], {"auth": f"auth-{i % ACCOUNTS}"}),
+        "setone": lambda i: db.setone("accounts", {"running": i % 2}, {"auth": f"auth-{i % ACCOUNTS}"}),
+        "set_obj": lambda i: db.set_obj("accounts", {"type": "t", "name": f"set-{next(seq)}", "auth": f"auth-{i % ACCOUNTS}"})
+    }
+
+async def bench(n:int) -> dict:
+    results = {}
+    with _common.tempdir() as tmp:
+        db = await MDBAsyncObj.open(os.path.join(tmp, "mdb.db"))
+        await db.set_objs("accounts", [{"type": "t", "name": f"n{i}", "auth": f"auth-{i}"} for i in range(ACCOUNTS)])
+        ops = operations(db)
+
+        for name, op in ops.items():
+            samples = []
+            for i in range(min(n, 2000)):
+                start = perf_counter()
+                await op(i)
+                samples.append(perf_counter() - start)
+            results[f"{name}.latency"] = _common.latency(samples)
+
+        mixed = list(ops.values())
+        async def worker(w:int):
+            for i in range(w, n, COROUTINES):
+                await mixed[i % len(mixed)](i)
+
+        with _common.timer() as t:
+            await asyncio.gather(*(worker(w) for w in range(COROUTINES)))
+        results[f"mixed.c{COROUTINES}"] = _common.ops(n, t.elapsed)
+        await db.aclose()
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 10000)
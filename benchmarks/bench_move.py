@@ -0,0 +1,44 @@
+# ShutilAsync: move в цикле против move_many, на tmpfs и на диске, плюс перенос между устройствами
+import os, asyncio
+
+import _common
+
+ShutilAsync = _common.module("ShutilAsync").ShutilAsync
+
+SHM = "/dev/shm"
+
+def fixtures(directory:str, n:int, size:int=4096) -> list:
+    os.makedirs(directory, exist_ok=True)
+    data = os.urandom(size)
+    paths = []
+    for i in range(n):
+        path = os.path.join(directory, f"f{i}.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+async def run(name:str, src_base:str|None, dst_base:str|None, n:int, results:dict) -> None:
+    with _common.tempdir(base=src_base) as src, _common.tempdir(base=dst_base) as dst:
+        paths = await asyncio.to_thread(fixtures, os.path.join(src, "a"), n)
+        with _common.timer() as t:
+            for i, path in enumerate(paths):
+                await ShutilAsync.move(path, os.path.join(dst, "loop", str(i % 16)))
+        results[f"{name}.move"] = _common.ops(n, t.elapsed)
+
+        paths = await asyncio.to_thread(fixtures, os.path.join(src, "b"), n)
+        with _common.timer() as t:
+            await ShutilAsync.move_many([(path, os.path.join(dst, "many", str(i % 16))) for i, path in enumerate(paths)])
+        results[f"{name}.move_many"] = _common.ops(n, t.elapsed)
+
+async def bench(n:int) -> dict:
+    results = {}
+    shm = SHM if os.path.isdir(SHM) else None
+    await run("disk", None, None, n, results)
+    if shm:
+        await run("tmpfs", shm, shm, n, results)
+        await run("cross_device", shm, None, n, results)
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 5000)
@@ -0,0 +1,49 @@
+# Пул соединений MDBAsync против соединения на каждый запрос
+import os, asyncio, aiosqlite
+
+import _common
+
+MDBAsync = _common.module("MDBAsync").MDBAsync
+
+class LegacyMDBAsync(MDBAsync):
+    # Прежнее поведение execute: новое соединение на каждый запрос
+    async def execute(self, sql:str, params:tuple|list|None=None, close=True) -> dict|None:
+        conn = await aiosqlite.connect(self.path)
+        csr = await conn.cursor()
+        sett = None
+        try:
+            sett = await ((csr.executemany(sql, params) if isinstance(params, list) else csr.execute(sql, params)) if params else csr.execute(sql))
+            await conn.commit()
+        finally:
+            if close:
+                await conn.close()
+            else:
+                return {"conn": conn, "set": sett}
+
+async def workload(db:MDBAsync, n:int, concurrency:int) -> float:
+    async def worker(w:int):
+        for i in range(w, n, concurrency):
+            auth = f"auth-{i % 100}"
+            if i % 4:
+                await db.getone("accounts", ["id", "name"], {"auth": auth})
+            else:
+                await db.setone("accounts", {"running": i % 2}, {"auth": auth})
+
+    with _common.timer() as t:
+        await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    await db.aclose()
+    return t.elapsed
+
+async def bench(n:int) -> dict:
+    results = {}
+    with _common.tempdir() as tmp:
+        for name, cls in (("per_call", LegacyMDBAsync), ("pool", MDBAsync)):
+            db = await cls.open(os.path.join(tmp, f"{name}.db"))
+            await db.addrows("accounts", [{"type": "t", "name": f"n{i}", "auth": f"auth-{i}"} for i in range(100)])
+            for concurrency in (1, 16):
+                elapsed = await workload(db, n, concurrency)
+                results[f"{name}.c{concurrency}"] = _common.ops(n, elapsed)
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 2000)
@@ -0,0 +1,43 @@
+# Задержка чтения под параллельной нагрузкой записи для каждого профиля хранения
+import os, time, asyncio
+
+import _common
+
+MDBAsync = _common.module("MDBAsync").MDBAsync
+
+async def measure(db:MDBAsync, n:int, readers:int) -> list:
+    stop = asyncio.Event()
+    samples = []
+
+    async def writer():
+        i = 0
+        while not stop.is_set():
+            await db.setone("accounts", {"running": i % 2, "error": str(i)}, {"auth": f"auth-{i % 100}"})
+            i += 1
+
+    async def reader(r:int):
+        for i in range(r, n, readers):
+            start = time.perf_counter()
+            await db.getone("accounts", ["id", "running"], {"auth": f"auth-{i % 100}"})
+            samples.append(time.perf_counter() - start)
+
+    writing = asyncio.create_task(writer())
+    await asyncio.gather(*(reader(r) for r in range(readers)))
+    stop.set()
+    await writing
+    return samples
+
+async def bench(n:int) -> dict:
+    results = {}
+    with _common.tempdir() as tmp:
+        for profile in MDBAsync.storage_profiles:
+            db = await MDBAsync.open(os.path.join(tmp, f"{profile}.db"), pool_size=4, storage=profile)
+            await db.addrows("accounts", [{"type": "t", "name": f"n{i}", "auth": f"auth-{i}"} for i in range(100)])
+            samples = await measure(db, n, 4)
+            await db.aclose()
+            for name, value in _common.latency(samples).items():
+                results[f"{profile}.read_{name}"] = value
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 2000)
@@ -0,0 +1,42 @@
+# Загрузка кэша MDBAsyncObj.update_obj на 10k/100k/1M строк, словари и компактные записи
+import os, gc, asyncio, sqlite3
+
+import _common
+
+MDBAsyncObj = _common.module("MDBAsync").MDBAsyncObj
+
+SIZES = (10000, 100000, 1000000)
+
+def fill(path:str, size:int) -> None:
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO `accounts` (`type`, `name`, `auth`, `running`, `error`) VALUES (?, ?, ?, ?, ?)",
+            ((f"type-{i % 8}", f"name-{i}", f"auth-{i:032x}", i % 2, '{"code": 0}') for i in range(size))
+        )
+    conn.close()
+
+async def bench(n:int) -> dict:
+    results = {}
+    # При малом n (быстрый прогон) берём хотя бы n строк
+    sizes = [size for size in SIZES if size <= n] or [n]
+    with _common.tempdir() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"rows-{size}.db")
+            # Схему создаёт сам MDBAsyncObj, строки вставляем напрямую через sqlite3
+            db = await MDBAsyncObj.open(path)
+            await db.aclose()
+            await asyncio.to_thread(fill, path, size)
+            for name, compact in (("dict", False), ("compact", True)):
+                # Конструктор уже загружает кэш; замеряем повторную загрузку
+                db = await MDBAsyncObj.open(path, compact=compact)
+                gc.collect()
+                with _common.timer() as t:
+                    await db.update_obj()
+                results[f"{name}.rows_{size}"] = _common.metric(t.elapsed, "s", False)
+                db.obj = {}
+                await db.aclose()
+    return results
+
+if __name__ == "__main__":
+    _common.main(bench, 1000000)
@@ -0,0 +1,107 @@
+# Запуск всех bench_*.py (каждый в отдельном процессе) со сводным JSON и сравнением с сохранённым базовым прогоном:
+#   python run.py --save baseline.json
+#   python run.py --baseline baseline.json --tolerance 0.15
+import os, sys, json, time, glob, argparse, platform, sqlite3, subprocess, tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def discover(only:list|None=None) -> list:
+    names = sorted(os.path.basename(path)[:-3] for path in glob.glob(os.path.join(HERE, "bench_*.py")))
+    if only:
+        names = [name for name in names if name in only or name[len("bench_"):] in only]
+    return names
+
+# Вложенные результаты бенчмарка -> {"bench.key.subkey": metric}
+def flatten(results:dict, prefix:str) -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict) and "value" not in value:
+            flat.update(flatten(value, f"{prefix}.{key}"))
+        else:
+            flat[f"{prefix}.{key}"] = value
+    return flat
+
+def run_bench(name:str, scale:float, timeout:float, cwd:str) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as file:
+        output = file.name
+    try:
+        # Каждый бенчмарк в своём процессе: синглтоны, пулы и память не переходят между ними
+        subprocess.run(
+            [sys.executable, os.path.join(HERE, f"{name}.py"), "--scale", str(scale), "--json", output],
+            cwd=cwd, timeout=timeout, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        with open(output, encoding="utf-8") as file:
+            return json.load(file)
+    finally:
+        os.remove(output)
+
+def compare(results:dict, baseline:dict, tolerance:float) -> list:
+    rows = []
+    for key, metric in results.items():
+        base = baseline.get(key)
+        if not base or not base.get("value"):
+            continue
+        change = (metric["value"] - base["value"]) / base["value"]
+        # Для "higher": false (задержки, размеры) рост - это ухудшение
+        worse = -change if metric.get("higher", True) else change
+        status = "regression" if worse > tolerance else "improvement" if worse < -tolerance else "ok"
+        rows.append({"key": key, "baseline": base["value"], "value": metric["value"], "unit": metric.get("unit"), "change": change, "status": status})
+    return rows
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Async benchmark suite")
+    parser.add_argument("--only", default="", help="comma separated benchmark names, e.g. pool,mdb")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for each benchmark's default size")
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--output", default=None, help="write results JSON here instead of stdout")
+    parser.add_argument("--save", default=None, help="store results as a baseline file")
+    parser.add_argument("--baseline", default=None, help="compare with a stored baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "cpus": os.cpu_count(),
+            "scale": args.scale
+        },
+        "results": {},
+        "errors": {}
+    }
+
+    with tempfile.TemporaryDirectory(prefix="bench-run-") as cwd:
+        for name in discover([item for item in args.only.split(",") if item]):
+            print(f"running {name}", file=sys.stderr)
+            try:
+                report["results"].update(flatten(run_bench(name, args.scale, args.timeout, cwd), name))
+            except subprocess.CalledProcessError as e:
+                report["errors"][name] = (e.stderr or "").strip().splitlines()[-1:] or [f"exit {e.returncode}"]
+            except subprocess.TimeoutExpired:
+                report["errors"][name] = [f"timeout after {args.timeout}s"]
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        report["comparison"] = compare(report["results"], baseline.get("results", {}), args.tolerance)
+        for row in report["comparison"]:
+            if row["status"] != "ok":
+                print(f"{row['status']:<12} {row['key']}: {row['baseline']:.6g} -> {row['value']:.6g} {row['unit']} ({row['change']:+.1%})", file=sys.stderr)
+        regressions = sum(row["status"] == "regression" for row in report["comparison"])
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    for path in (args.output, args.save):
+        if path:
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(text)
+    if not args.output:
+        print(text)
+    for name, error in report["errors"].items():
+        print(f"failed {name}: {' '.join(error)}", file=sys.stderr)
+    return 1 if regressions or report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())